@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Performance benchmarks for the virus integrators, trajectory storage,
+visuals and simcx simulators.
+
+    python3 bench.py [-o bench.json] [--quick] [--only GROUP ...]
+
+Results are written as JSON (one record per measurement plus the versions
+they were taken with) so runs of different revisions can be compared.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from hiv.models import HIVModel
+from hiv.simulators import (VirusIterator, VirusEulerSimulator,
+                            VirusHeunSimulator, VirusRK4Simulator,
+                            VirusRK45Simulator, VirusRosenbrockSimulator,
+                            VirusAutoSimulator)
+
+
+INTEGRATORS = (VirusIterator, VirusEulerSimulator, VirusHeunSimulator,
+               VirusRK4Simulator, VirusRK45Simulator,
+               VirusRosenbrockSimulator, VirusAutoSimulator)
+# Integrators that factorise the dense (2M + 1)^2 Jacobian
+IMPLICIT = (VirusRosenbrockSimulator, VirusAutoSimulator)
+MUTANTS = (1, 10, 100, 1000, 10000)
+
+
+def model() -> HIVModel:
+    return HIVModel(k=0.01, b=0.01, u=0.01, c=0.01, r=0.8, p=0.01, q=0.01)
+
+
+def simulator(integrator, mutants: int, **kwargs):
+    return integrator(model(), np.ones(mutants), np.ones(mutants), 1.,
+                      step=0.01, **kwargs)
+
+
+def timed(fn, min_time: float) -> tuple[int, float]:
+    """Call fn(n) with a doubling n until it takes at least *min_time*."""
+    n = 1
+    while True:
+        start = time.perf_counter()
+        fn(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n, elapsed
+        n *= 2
+
+
+def bench_integrators(opts) -> list[dict]:
+    results = []
+    mutants = MUTANTS[:3] if opts.quick else MUTANTS
+    for integrator in INTEGRATORS:
+        for m in mutants:
+            if integrator in IMPLICIT and m > opts.max_implicit:
+                continue
+            # Capped so adaptive steps stay comparable as the orbit settles
+            kwargs = {"max_step": 0.1} \
+                if issubclass(integrator, VirusRK45Simulator) else {}
+            sim = simulator(integrator, m, **kwargs)
+            sim.run(1)
+            with np.errstate(all="ignore"):
+                n, elapsed = timed(lambda n: sim.run(n, every=n),
+                                   opts.min_time)
+            results.append({"group": "integrators",
+                            "name": integrator.__name__, "mutants": m,
+                            "value": n / elapsed, "unit": "steps/s"})
+    return results
+
+
+def bench_memory(opts) -> list[dict]:
+    results = []
+    steps = 10 ** 5 if opts.quick else 10 ** 6
+    for m in (1, 100):
+        tracemalloc.start()
+        sim = simulator(VirusEulerSimulator, m)
+        base = tracemalloc.get_traced_memory()[0]
+        done = 0
+        for checkpoint in (steps // 100, steps // 10, steps):
+            sim.run(checkpoint - done)
+            done = checkpoint
+            current, peak = tracemalloc.get_traced_memory()
+            results.append({"group": "memory", "name": "VirusEulerSimulator",
+                            "mutants": m, "steps": done,
+                            "value": current - base, "peak": peak - base,
+                            "unit": "bytes"})
+        tracemalloc.stop()
+    return results
+
+
+def bench_visuals(opts) -> list[dict]:
+    from hiv.visuals import VirusVisual, VirusPhaseSpace
+
+    results = []
+    lengths = (10 ** 3, 10 ** 5) if opts.quick \
+        else (10 ** 3, 10 ** 5, 10 ** 6)
+    for visual in (VirusVisual, VirusPhaseSpace):
+        sim = simulator(VirusHeunSimulator, 2)
+        vis = visual(sim)
+        for length in lengths:
+            sim.run(length - len(sim._t) + 1)
+            for name, fn in (("draw", vis.draw),
+                             ("update_image", vis.update_image)):
+                n, elapsed = timed(lambda n: [fn() for _ in range(n)],
+                                   opts.min_time)
+                results.append({"group": "visuals", "name": visual.__name__,
+                                "method": name, "samples": length,
+                                "value": elapsed / n, "unit": "s/frame"})
+    return results
+
+
+def bench_population(opts) -> list[dict]:
+    from hiv.population import VirusPopulationRK4Simulator
+
+    # All but ten mutants start extinct and are compacted away on the first
+    # step, so the step rate should only follow the live count
+    results = []
+    for total in (10, 1000) if opts.quick else (10, 1000, 100000):
+        v = np.zeros(total)
+        v[:10] = 1.
+        sim = VirusPopulationRK4Simulator(model(), np.ones(total), v, 1.,
+                                          step=0.01, extinction=0.)
+        sim.run(1)
+        n, elapsed = timed(lambda n: sim.run(n, every=n), opts.min_time)
+        results.append({"group": "population",
+                        "name": "VirusPopulationRK4Simulator",
+                        "live": len(sim.ids), "mutants": total,
+                        "value": n / elapsed, "unit": "steps/s"})
+    return results
+
+
+def bench_julia(opts) -> list[dict]:
+    from simcx import simulators
+
+    results = []
+    samples = 200 if opts.quick else 500
+    available = simulators.USE_NE
+    try:
+        for use_ne in (False, True) if available else (False,):
+            # JuliaSet computes the whole set on construction
+            simulators.USE_NE = use_ne
+            n, elapsed = timed(
+                lambda n: [simulators.JuliaSet(complex(-0.8, 0.156),
+                                               samples=samples)
+                           for _ in range(n)], opts.min_time)
+            results.append({"group": "julia",
+                            "name": "numexpr" if use_ne else "numpy",
+                            "samples": samples,
+                            "value": elapsed / n, "unit": "s"})
+    finally:
+        simulators.USE_NE = available
+    return results
+
+
+GROUPS = {"integrators": bench_integrators,
+          "memory": bench_memory,
+          "visuals": bench_visuals,
+          "population": bench_population,
+          "julia": bench_julia}
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"],
+                                  capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {"revision": revision,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor()}
+
+
+def main(argv: list[str] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-o", "--output", default="bench.json")
+    parser.add_argument("--only", nargs="+", choices=GROUPS,
+                        default=list(GROUPS))
+    parser.add_argument("--quick", action="store_true",
+                        help="smaller sizes, for a fast smoke run")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum seconds timed per measurement")
+    parser.add_argument("--max-implicit", type=int, default=100,
+                        help="largest mutant count for implicit integrators")
+    opts = parser.parse_args(argv)
+
+    report = {"environment": environment(), "results": []}
+    for group in opts.only:
+        for result in GROUPS[group](opts):
+            print(json.dumps(result), flush=True)
+            report["results"].append(result)
+
+    with open(opts.output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,16 @@
-from . import models
-from . import simulators
+import importlib
+
+# Sub-modules are imported on first access (hiv.sweep, ...), so a worker
+# that only needs the integrators does not load the rest of the package
+_SUBMODULES = ("models", "simulators", "trajectory", "ensemble", "events",
+               "population", "sweep", "analysis", "lyapunov", "regimes")
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_SUBMODULES))
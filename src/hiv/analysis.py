@@ -0,0 +1,74 @@
+import numpy as np
+
+from . import codegen
+
+
+STABLE, UNSTABLE, HOPF, INVALID = 0, 1, 2, 3
+STABILITY = ("stable", "unstable", "hopf", "invalid")
+
+
+def classify(eigenvalues: np.ndarray, hopf_tol: float = 1e-6) -> np.ndarray:
+    """Stability label of each fixed point from its Jacobian eigenvalues
+    (last axis). A Hopf candidate has a complex leading pair whose real
+    part is within *hopf_tol* of zero."""
+    valid = np.isfinite(eigenvalues).all(axis=-1)
+    safe = np.where(valid[..., np.newaxis], eigenvalues, 0)
+    lead = np.take_along_axis(
+        safe, np.argmax(safe.real, axis=-1)[..., np.newaxis], axis=-1)[..., 0]
+
+    label = np.where(lead.real < 0, STABLE, UNSTABLE)
+    label[(np.abs(lead.real) <= hopf_tol) & (lead.imag != 0)] = HOPF
+    label[~valid] = INVALID
+    return label
+
+
+def fixed_points(model_cls: type, params: dict[str, np.ndarray],
+                 mutants: int = 1,
+                 hopf_tol: float = 1e-6) -> dict[str, np.ndarray]:
+    """Fixed points of *model_cls* and their stability for every parameter
+    set in *params* (arrays of equal length, or scalars).
+
+    Mutants are interchangeable, so each equilibrium is reported once per
+    number of active mutants (listed first in ``x``/``v``); the inactive
+    ones sit at zero. The first axis of every result enumerates those
+    equilibria, the second one the parameter sets.
+    """
+    sizes = {len(np.atleast_1d(a)) for a in params.values()}
+    size = max(sizes)
+    if not sizes <= {1, size}:
+        raise Exception("Parameter arrays must share the same length")
+    params = {p: np.broadcast_to(np.asarray(a, dtype=float), (size,))
+              for p, a in params.items()}
+
+    compiled = codegen.compile_equilibria(model_cls, model_cls.PARAMETERS)
+    values = tuple(params[p] for p in compiled.PARAMS)
+    model = model_cls(**{p: a[:, np.newaxis] for p, a in params.items()})
+
+    active, roots = [0], [(0., 0., 0.)]
+    with np.errstate(all="ignore"):
+        for n in range(1, mutants + 1):
+            flat = compiled.equilibria(n, *values)
+            for i in range(compiled.ROOTS):
+                active.append(n)
+                roots.append(flat[3 * i:3 * i + 3])
+
+    shape = (len(roots), size)
+    x, v = np.zeros(shape + (mutants,)), np.zeros(shape + (mutants,))
+    z = np.empty(shape)
+    for e, (n, (xi, vi, zi)) in enumerate(zip(active, roots)):
+        x[e, :, :n] = np.broadcast_to(xi, (size,))[:, np.newaxis]
+        v[e, :, :n] = np.broadcast_to(vi, (size,))[:, np.newaxis]
+        z[e] = zi
+
+    eigenvalues = np.full(shape + (2 * mutants + 1,), np.nan, dtype=complex)
+    with np.errstate(all="ignore"):
+        for e in range(len(roots)):
+            svi = np.sum(v[e], axis=-1, keepdims=True)
+            jac = model.jacobian(x[e], v[e], z[e][:, np.newaxis], svi)
+            valid = np.isfinite(jac).all(axis=(-2, -1))
+            eigenvalues[e, valid] = np.linalg.eigvals(jac[valid])
+
+    return {"active": np.array(active),
+            "x": x, "v": v, "z": z,
+            "eigenvalues": eigenvalues,
+            "stability": classify(eigenvalues, hopf_tol)}
@@ -0,0 +1,331 @@
+import os
+import hashlib
+import functools
+import inspect
+import importlib.util
+import numpy as np
+
+from types import ModuleType
+
+# Bump whenever the generated source changes shape, so stale caches are
+# not picked up.
+VERSION = 2
+
+_modules = {}
+
+
+def cache_dir() -> str:
+    return os.environ.get("HIV_CACHE_DIR", os.path.join(
+        os.path.expanduser("~"), ".cache", "hiv"))
+
+
+def equation_hash(model_cls: type, params: tuple[str, ...],
+                  kind: str = "model") -> str:
+    """Hash of the source of the model equations and of its parameter
+    names. It is computed without sympy, so cache hits never import it."""
+    digest = hashlib.sha256(f"{VERSION}:{kind}:{model_cls.__name__}:{params}"
+                            .encode())
+    for name in ("x", "v", "z"):
+        digest.update(inspect.getsource(getattr(model_cls, name)).encode())
+    return digest.hexdigest()[:16]
+
+
+def equations(model_cls: type, params: tuple[str, ...]) -> tuple:
+    """Symbolic per-mutant equations of *model_cls* as
+    ``((xi, vi, z, svi), (dxi, dvi, dz))``."""
+    import sympy as sym
+
+    xi, vi, z, svi = sym.symbols("xi vi z svi")
+
+    # Evaluating the numeric equations on symbols gives the symbolic ones
+    model = object.__new__(model_cls)
+    model.args = {p: sym.Symbol(p) for p in params}
+    return ((xi, vi, z, svi),
+            (model.x(xi, vi, z, svi), model.v(xi, vi, z),
+             model.z(xi, vi, z, svi)))
+
+
+@functools.lru_cache(maxsize=None)
+def equilibria(model_cls: type, params: tuple[str, ...]) -> list[dict]:
+    """Closed form fixed points with ``n`` identical active mutants (the
+    others sit at ``xi = vi = 0``), as sympy dicts over ``xi, vi, z``."""
+    import sympy as sym
+
+    (xi, vi, z, svi), eqs = equations(model_cls, tuple(sorted(params)))
+    n = sym.Symbol("n", positive=True, integer=True)
+    return sym.solve([e.subs(svi, n * vi) for e in eqs], [xi, vi, z],
+                     dict=True)
+
+
+def _function(name: str, signature: str, exprs: list) -> str:
+    import sympy as sym
+    from sympy.printing.numpy import NumPyPrinter
+
+    printer = NumPyPrinter()
+    replacements, reduced = sym.cse(exprs)
+    lines = [f"def {name}({signature}):"]
+    lines += [f"    {s} = {printer.doprint(e)}" for s, e in replacements]
+    lines.append("    return (" + ", ".join(
+        printer.doprint(e) for e in reduced) + ",)")
+    return "\n".join(lines)
+
+
+class _InPlace:
+    """Emits statements that evaluate expressions with NumPy ufuncs
+    writing into given buffers, so nothing is allocated. Intermediate
+    results go to work buffers ``w[i]`` shaped like ``xi`` ("x") when they
+    depend on a mutant's state and like ``z`` ("z") otherwise; their kinds
+    end up in :attr:`work`. Parts that only depend on the parameters are
+    plain Python numbers and are written out as they are."""
+
+    OPS = {"Add": "numpy.add", "Mul": "numpy.multiply"}
+
+    def __init__(self: object, printer, mutant: set, state: set) -> None:
+        self._printer = printer
+        self._mutant = set(mutant)
+        self._state = set(state)
+        self._constants = {}
+        self._names = {}
+        self._free = {"x": [], "z": []}
+        self.work = []
+        self.lines = []
+
+    def kind(self: object, expr) -> str:
+        return "x" if expr.free_symbols & self._mutant else "z"
+
+    def bind(self: object, symbol, expr) -> None:
+        # A common subexpression gets a buffer of its own
+        if self._constant(expr):
+            self._constants[symbol] = expr.xreplace(self._constants)
+            return
+        self._state.add(symbol)
+        name = self._alloc(self.kind(expr))
+        self.emit(expr, name)
+        self._names[symbol] = name
+        if self.kind(expr) == "x":
+            self._mutant.add(symbol)
+
+    def emit(self: object, expr, target: str) -> None:
+        if expr.is_Atom:
+            self._line(f"numpy.copyto({target}, {self._atom(expr)})")
+        elif type(expr).__name__ in self.OPS:
+            self._fold(self._operations(expr), target, self.kind(expr))
+        elif expr.is_Pow and expr.exp == -1:
+            self._unary("numpy.divide(1, {0}, out={1})", expr.base, target)
+        elif expr.is_Pow and expr.exp == 2:
+            self._unary("numpy.multiply({0}, {0}, out={1})", expr.base,
+                        target)
+        elif expr.is_Pow:
+            self._unary("numpy.power({0}, " + self._atom(expr.exp) +
+                        ", out={1})", expr.base, target)
+        elif expr.is_Function and len(expr.args) == 1 and \
+                hasattr(np, type(expr).__name__):
+            self._unary("numpy." + type(expr).__name__ + "({0}, out={1})",
+                        expr.args[0], target)
+        else:
+            raise NotImplementedError(f"No in place form of {expr}")
+
+    def _grouped(self: object, expr) -> list:
+        # Operands that do not depend on a mutant are combined first, in a
+        # small "z" buffer, so each "x" sized operand costs one pass
+        args = list(expr.args)
+        constant = [a for a in args if self._constant(a)]
+        if len(constant) > 1:
+            args = [expr.func(*constant)] + [a for a in args
+                                             if a not in constant]
+        small = [a for a in args if self.kind(a) == "z"]
+        if self.kind(expr) == "z" or len(small) < 2:
+            return args
+        return [expr.func(*small)] + [a for a in args if a not in small]
+
+    def _operations(self: object, expr) -> list[tuple[str, object]]:
+        # (ufunc, operand) pairs, the negated terms of a sum subtracted and
+        # a negated product folded into one of its sums, so no pass is
+        # spent on multiplying by -1
+        op = self.OPS[type(expr).__name__]
+        if expr.is_Mul and expr.could_extract_minus_sign() and \
+                any(a.is_Add for a in expr.args):
+            i = next(i for i, a in enumerate(expr.args) if a.is_Add)
+            expr = expr.func(*expr.args[:i], -expr.args[i],
+                             *expr.args[i + 1:], -1)
+        args = self._grouped(expr)
+        minus = [a for a in args
+                 if expr.is_Add and a.could_extract_minus_sign()]
+        if len(minus) == len(args):
+            minus = minus[1:]
+        return ([(op, a) for a in args if a not in minus] +
+                [("numpy.subtract", -a) for a in minus])
+
+    def _fold(self: object, operations: list, target: str,
+              kind: str) -> None:
+        # The first operand of the same kind is evaluated in the target
+        # itself, others in work buffers of their own kind
+        operands, works, first = [], [], None
+        for op, arg in operations:
+            if self._is_atom(arg):
+                operands.append((op, self._atom(arg)))
+            elif first is None and op == operations[0][0] and \
+                    self.kind(arg) == kind:
+                self.emit(arg, target)
+                first = target
+            else:
+                work = self._alloc(self.kind(arg))
+                self.emit(arg, work)
+                operands.append((op, work))
+                works.append(work)
+        if first is None:
+            (_, first), operands = operands[0], operands[1:]
+        for op, operand in operands:
+            self._line(f"{op}({first}, {operand}, out={target})")
+            first = target
+        if first != target:
+            self._line(f"numpy.copyto({target}, {first})")
+        for work in works:
+            self._free[self._kind_of(work)].append(work)
+
+    def _unary(self: object, template: str, arg, target: str) -> None:
+        if self._is_atom(arg):
+            self._line(template.format(self._atom(arg), target))
+        else:
+            self.emit(arg, target)
+            self._line(template.format(target, target))
+
+    def _is_atom(self: object, expr) -> bool:
+        return expr.is_Atom or expr in self._names or self._constant(expr)
+
+    def _constant(self: object, expr) -> bool:
+        return not expr.free_symbols & self._state
+
+    def _atom(self: object, expr) -> str:
+        return self._names.get(expr) or self._printer.doprint(
+            expr.xreplace(self._constants))
+
+    def _alloc(self: object, kind: str) -> str:
+        if self._free[kind]:
+            return self._free[kind].pop()
+        self.work.append(kind)
+        return f"w[{len(self.work) - 1}]"
+
+    def _kind_of(self: object, work: str) -> str:
+        return self.work[int(work[2:-1])]
+
+    def _line(self: object, line: str) -> None:
+        self.lines.append("    " + line)
+
+
+def _function_out(name: str, signature: str, state: tuple,
+                  exprs: list) -> list[str]:
+    """``name(signature, out, w)``, writing *exprs* into the buffers of
+    *out* with the work buffers *w*, followed by ``WORK``, their kinds.
+    ``name`` is None when some expression has no in place form."""
+    import sympy as sym
+    from sympy.printing.numpy import NumPyPrinter
+
+    xi, vi, _, _ = state
+    emitter = _InPlace(NumPyPrinter(), {xi, vi}, set(state))
+    replacements, reduced = sym.cse(exprs)
+    try:
+        for symbol, expr in replacements:
+            emitter.bind(symbol, expr)
+        for i, expr in enumerate(reduced):
+            emitter.emit(expr, f"out[{i}]")
+    except NotImplementedError:
+        return [f"{name} = None", "", "WORK = ()"]
+    return ([f"def {name}({signature}, out, w):"] + emitter.lines +
+            ["    return out", "", "", f"WORK = {tuple(emitter.work)!r}"])
+
+
+def _header(model_cls: type, params: tuple[str, ...]) -> list[str]:
+    return [f"# Generated by hiv.codegen from {model_cls.__name__}, "
+            "do not edit.",
+            "import numpy",
+            "",
+            f"PARAMS = {tuple(params)!r}",
+            "",
+            ""]
+
+
+def _generate_model(model_cls: type, params: tuple[str, ...]) -> str:
+    import sympy as sym
+
+    state, eqs = equations(model_cls, params)
+    partials = [sym.diff(e, s) for e in eqs for s in state]
+    signature = ", ".join(str(s) for s in state + tuple(params))
+
+    return "\n".join(_header(model_cls, params) + [
+        _function("rhs", signature, eqs),
+        "",
+        "",
+        "# rhs() written into out = (dxi, dvi, dz) with the work buffers w",
+        *_function_out("rhs_out", signature, state, eqs),
+        "",
+        "",
+        "# d(x, v, z equation) / d(xi, vi, z, svi), row by row",
+        _function("partials", signature, partials),
+        ""])
+
+
+def _generate_equilibria(model_cls: type, params: tuple[str, ...]) -> str:
+    import sympy as sym
+
+    (xi, vi, z, _), _ = equations(model_cls, params)
+    # The trivial fixed point is handled by the caller as "no active mutant"
+    roots = [r for r in equilibria(model_cls, params) if r[vi] != 0]
+    exprs = [r.get(s, sym.nan) for r in roots for s in (xi, vi, z)]
+    signature = ", ".join(("n",) + tuple(params))
+
+    return "\n".join(_header(model_cls, params) + [
+        f"ROOTS = {len(roots)}",
+        "",
+        "",
+        "# (xi, vi, z) of every non-trivial root, flattened",
+        _function("equilibria", signature, exprs),
+        ""])
+
+
+def _load(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _compile(kind: str, generate, model_cls: type,
+             params: tuple[str, ...]):
+    params = tuple(sorted(params))
+    key = equation_hash(model_cls, params, kind)
+    if key in _modules:
+        return _modules[key]
+
+    name = f"{model_cls.__name__}_{kind}_{key}"
+    path = os.path.join(cache_dir(), name + ".py")
+    if os.path.exists(path):
+        _modules[key] = _load(name, path)
+        return _modules[key]
+
+    source = generate(model_cls, params)
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(source)
+        os.replace(tmp, path)
+        _modules[key] = _load(name, path)
+    except OSError:
+        # Read-only or missing cache directory: keep the code in memory
+        _modules[key] = ModuleType(name)
+        exec(compile(source, name, "exec"), _modules[key].__dict__)
+    return _modules[key]
+
+
+def compile_model(model_cls: type, params: tuple[str, ...]):
+    """Return a module with fused ``rhs`` and ``partials`` functions for
+    *model_cls*, generating and caching it on disk on first use."""
+    return _compile("model", _generate_model, model_cls, params)
+
+
+def compile_equilibria(model_cls: type, params: tuple[str, ...]):
+    """Return a module whose ``equilibria(n, *params)`` evaluates the closed
+    form non-trivial fixed points of *model_cls* with ``n`` active mutants,
+    generating and caching it on disk on first use."""
+    return _compile("equilibria", _generate_equilibria, model_cls, params)
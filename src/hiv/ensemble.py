@@ -0,0 +1,143 @@
+import numpy as np
+
+from .models import GenericVirusModel
+from .simulators import (VirusSimulator, VirusIterator, VirusEulerSimulator,
+                         VirusHeunSimulator, VirusRK4Simulator)
+from .trajectory import Trajectory
+
+
+class VirusEnsemble(VirusSimulator):
+    """Integrates a batch of independent virus models at once.
+
+    Every member shares the number of mutants but may have its own
+    parameters and initial conditions. The state carries a leading batch
+    axis: ``x`` and ``v`` are ``(members, mutants)`` and ``z`` is kept as
+    ``(members, 1)`` so that the model equations broadcast unchanged.
+    Model parameters may be scalars or arrays of length ``members``.
+
+    Members stopped by a terminal event drop out of the active set: they
+    keep their last state in the stored samples and are no longer
+    integrated, so each step only costs the members still running.
+    """
+
+    def __init__(self: object, model: GenericVirusModel,
+                 x: np.ndarray, v: np.ndarray, z: np.ndarray,
+                 step: float = 0.1, start: float = 0.0,
+                 capacity: int = 1024, trajectory: Trajectory = None) -> None:
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        v = np.atleast_2d(np.asarray(v, dtype=float))
+        self._members = x.shape[0]
+        z = np.broadcast_to(np.asarray(z, dtype=float),
+                            (self._members,)).reshape(-1, 1)
+
+        model = model.__class__(**{
+            p: np.broadcast_to(np.asarray(a, dtype=float),
+                               (self._members,)).reshape(-1, 1)
+            for p, a in model.args.items()})
+
+        super(VirusEnsemble, self).__init__(model, x, v, z, step=step,
+                                            start=start, capacity=capacity,
+                                            trajectory=trajectory)
+        self._ensemble_model = model
+        # Active member indices and the full state the inactive ones are
+        # frozen in; both None while every member is active
+        self._rows = None
+        self._frozen = None
+
+    @property
+    def active(self: object) -> np.ndarray:
+        """Mask of the members still being integrated."""
+        if self._rows is None:
+            return np.ones(self._members, dtype=bool)
+        mask = np.zeros(self._members, dtype=bool)
+        mask[self._rows] = True
+        return mask
+
+    def _head(self: object) -> tuple[np.ndarray, np.ndarray,
+                                     np.ndarray, float]:
+        x, v, z, t = self._last
+        if self._rows is None:
+            return x, v, z, t
+        return x[self._rows], v[self._rows], z[self._rows], t
+
+    def _expand(self: object, x: np.ndarray, v: np.ndarray,
+                z: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Full state from that of the active members; the result is reused
+        # by the next call
+        if self._rows is None:
+            return x, v, z
+        for full, a in zip(self._frozen, (x, v, z)):
+            full[self._rows] = a
+        return self._frozen
+
+    def _append(self: object, x: np.ndarray, v: np.ndarray,
+                z: np.ndarray, t: float) -> None:
+        super(VirusEnsemble, self)._append(*self._expand(x, v, z), t)
+
+    def _members_of(self: object, index: np.ndarray) -> np.ndarray:
+        return index if self._rows is None else self._rows[index]
+
+    def _drop(self: object, done: np.ndarray, x: np.ndarray, v: np.ndarray,
+              z: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Freeze the active members flagged in *done* at their state in
+        *x*, *v*, *z* and return the state of the remaining ones."""
+        if self._rows is None:
+            self._rows = np.arange(self._members)
+            self._frozen = tuple(np.array(a) for a in self._last[:3])
+        for full, a in zip(self._frozen, (x, v, z)):
+            full[self._rows[done]] = a[done]
+        keep = ~done
+        self._rows = self._rows[keep]
+        self._select(self._rows)
+        self.finished = not len(self._rows)
+        return x[keep], v[keep], z[keep]
+
+    def _select(self: object, rows: np.ndarray) -> None:
+        # Model restricted to *rows*, counting on from the current one
+        full = self._ensemble_model
+        model = full if rows is None else full.__class__(
+            **{p: a[rows] for p, a in full.args.items()})
+        model.evaluations = self._model.evaluations
+        model.jacobians = self._model.jacobians
+        self._model = model
+
+    def _terminate(self: object, stop: np.ndarray, t1: float, state1: tuple,
+                   t_stop: np.ndarray, state_stop: tuple) -> tuple:
+        # Stopped members end on their state at the crossing, the others
+        # carry on from the end of the step
+        x, v, z = (np.where(stop[:, np.newaxis], a, b)
+                   for a, b in zip(state_stop, state1))
+        return t1, self._drop(stop, x, v, z), self.finished
+
+    def reset(self):
+        super(VirusEnsemble, self).reset()
+        self._rows = None
+        self._frozen = None
+        self._select(None)
+
+    def _svi(self: object, v: np.ndarray,
+             out: np.ndarray = None) -> np.ndarray:
+        return np.sum(v, axis=-1, keepdims=True, out=out)
+
+    def __len__(self: object) -> int:
+        return self._members
+
+    def member(self: object, i: int) -> tuple[np.ndarray, np.ndarray,
+                                              np.ndarray, np.ndarray]:
+        return self._t, self._x[:, i], self._v[:, i], self._z[:, i, 0]
+
+
+class VirusEnsembleIterator(VirusEnsemble, VirusIterator):
+    pass
+
+
+class VirusEnsembleEulerSimulator(VirusEnsemble, VirusEulerSimulator):
+    pass
+
+
+class VirusEnsembleHeunSimulator(VirusEnsemble, VirusHeunSimulator):
+    pass
+
+
+class VirusEnsembleRK4Simulator(VirusEnsemble, VirusRK4Simulator):
+    pass
@@ -0,0 +1,178 @@
+import functools
+import numpy as np
+
+
+class Event:
+    """A function ``g(t, x, v, z)`` of the state whose zero crossings are
+    located between the integration steps of a :class:`VirusSimulator`.
+
+    ``z`` is handed over with the batch shape of the simulator (a float, or
+    one value per ensemble member) and ``g`` must return that shape too.
+    *direction* restricts the crossings to rising (1) or falling (-1) ones.
+    A *terminal* event stops the integration at the crossing, of the whole
+    simulator or, in an ensemble, of the member it happened to.
+
+    Crossing times, states and ensemble members are appended to ``t``,
+    ``states`` and ``members`` as they are found.
+    """
+
+    def __init__(self: object, fn, terminal: bool = False,
+                 direction: int = 0, name: str = None,
+                 xtol: float = 1e-10) -> None:
+        self._fn = fn
+        self.terminal = terminal
+        self.direction = direction
+        self.name = getattr(fn, "__name__", "event") if name is None \
+            else name
+        self.xtol = xtol
+        self.clear()
+
+    def clear(self: object) -> None:
+        self.t = []
+        self.states = []
+        self.members = []
+
+    def __call__(self: object, t: float, x: np.ndarray, v: np.ndarray,
+                 z: float) -> np.ndarray:
+        batch = np.shape(x)[:-1]
+        g = self._fn(t, x, v, np.reshape(z, batch))
+        return np.broadcast_to(np.asarray(g, dtype=float), batch)
+
+    def crossed(self: object, g0: np.ndarray, g1: np.ndarray) -> np.ndarray:
+        # A crossing ends on the far side of (or exactly on) zero, so a
+        # state sitting on the root does not trigger the event twice
+        rising = (g0 < 0) & (g1 >= 0)
+        falling = (g0 > 0) & (g1 <= 0)
+        if self.direction > 0:
+            return rising
+        if self.direction < 0:
+            return falling
+        return rising | falling
+
+    def __repr__(self: object) -> str:
+        return f"{self.__class__.__name__}({self.name!r})"
+
+
+def _viral_load(level, t, x, v, z):
+    return np.sum(v, axis=-1) - level
+
+
+def _immune_response(level, t, x, v, z):
+    return z - level
+
+
+def _divergence(limit, t, x, v, z):
+    size = np.maximum(np.max(np.abs(x), axis=-1), np.max(np.abs(v), axis=-1))
+    size = np.maximum(size, np.abs(z))
+    # NaN compares false everywhere, so it is mapped past the limit
+    return np.where(size <= limit, size - limit, 1.0)
+
+
+def viral_load(level: float, direction: int = 1,
+               terminal: bool = False) -> Event:
+    """Total viral load ``sum(v)`` crossing *level* (rising by default)."""
+    return Event(functools.partial(_viral_load, level), terminal=terminal,
+                 direction=direction, name="viral_load")
+
+
+def immune_collapse(level: float, terminal: bool = True) -> Event:
+    """Immune response ``z`` falling below *level*."""
+    return Event(functools.partial(_immune_response, level),
+                 terminal=terminal, direction=-1, name="immune_collapse")
+
+
+def divergence(limit: float = 1e12) -> Event:
+    """Any state variable leaving ``[-limit, limit]`` or turning inf/NaN.
+    Always terminal: nothing is gained by integrating past it."""
+    return Event(functools.partial(_divergence, limit), terminal=True,
+                 direction=1, name="divergence")
+
+
+class Monitor:
+    """Watches the events of a simulator over one run. :meth:`check` is
+    called after every step with the states at both ends of it."""
+
+    def __init__(self: object, sim, t: float, x: np.ndarray, v: np.ndarray,
+                 z: float) -> None:
+        self._sim = sim
+        self._g = [event(t, x, v, z) for event in sim.events]
+
+    def check(self: object, t0: float, state0: tuple, t1: float,
+              state1: tuple) -> tuple[float, tuple, bool]:
+        """Record the crossings within ``[t0, t1]``. Returns the time and
+        state to carry on from, cut short at a terminal crossing, and
+        whether the simulator has finished."""
+        events, g0 = self._sim.events, self._g
+        self._g = [event(t1, *state1) for event in events]
+        hits = [event.crossed(a, b)
+                for event, a, b in zip(events, g0, self._g)]
+        if not any(hit.any() for hit in hits):
+            return t1, state1, False
+
+        interpolant = self._sim._interpolant(t0, state0, t1, state1)
+        h = t1 - t0
+        s_events = [self._locate(event, interpolant, t0, h, g, hit)
+                    if hit.any() else None
+                    for event, g, hit in zip(events, g0, hits)]
+
+        # Crossings after the earliest terminal one never happened
+        s_stop = np.ones(np.shape(hits[0]))
+        for event, s, hit in zip(events, s_events, hits):
+            if event.terminal and s is not None:
+                s_stop = np.where(hit, np.minimum(s_stop, s), s_stop)
+        stop = np.zeros(np.shape(hits[0]), dtype=bool)
+        for event, s, hit in zip(events, s_events, hits):
+            if s is None:
+                continue
+            hit = hit & (s <= s_stop)
+            if event.terminal:
+                stop |= hit
+            self._record(event, interpolant, t0, h, s, hit, state1)
+
+        if not stop.any():
+            return t1, state1, False
+        t, state, finished = self._sim._terminate(
+            stop, t1, state1, t0 + s_stop * h,
+            self._state(interpolant, s_stop, state1))
+        self._g = [g[~stop] if np.ndim(g) else g for g in self._g]
+        return t, state, finished
+
+    def _locate(self: object, event: Event, interpolant, t0: float,
+                h: float, g0: np.ndarray, hit: np.ndarray) -> np.ndarray:
+        # Bisection on the step fraction s, all members at once; the upper
+        # end always lies on or past the crossing
+        lo, hi = np.zeros(np.shape(hit)), np.ones(np.shape(hit))
+        if interpolant is None:
+            return hi
+        negative = g0 < 0
+        tol = event.xtol * max(1.0, abs(t0)) / abs(h)
+        for _ in range(64):
+            if np.max((hi - lo)[hit]) <= tol:
+                break
+            mid = 0.5 * (lo + hi)
+            g = event(t0 + mid * h, *interpolant(mid))
+            below = np.where(negative, g < 0, g > 0)
+            lo, hi = np.where(below, mid, lo), np.where(below, hi, mid)
+        return hi
+
+    def _state(self: object, interpolant, s: np.ndarray,
+               fallback: tuple) -> tuple:
+        if interpolant is None:
+            return fallback
+        return interpolant(s)
+
+    def _record(self: object, event: Event, interpolant, t0: float, h: float,
+                s: np.ndarray, hit: np.ndarray, state1: tuple) -> None:
+        x, v, z = self._state(interpolant, s, state1)
+        t = t0 + s * h
+        if np.ndim(hit) == 0:
+            event.t.append(float(t))
+            event.states.append((x, v, z))
+            event.members.append(None)
+            return
+        z = np.reshape(z, np.shape(hit))
+        hit = np.flatnonzero(hit)
+        for i, member in zip(hit, self._sim._members_of(hit)):
+            event.t.append(float(t[i]))
+            event.states.append((x[i].copy(), v[i].copy(), float(z[i])))
+            event.members.append(int(member))
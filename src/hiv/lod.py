@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class _Level:
+    # (time of min, min, time of max, max) per bucket, with the same
+    # amortized growth as the trajectory buffers
+    def __init__(self: object) -> None:
+        self.arrays = tuple(np.empty(64) for _ in range(4))
+        self.size = 0
+
+    def view(self: object, start: int = 0) -> tuple[np.ndarray, ...]:
+        return tuple(a[start:self.size] for a in self.arrays)
+
+    def write(self: object, first: int, level: tuple) -> None:
+        end = first + len(level[0])
+        if end > len(self.arrays[0]):
+            capacity = max(end, 2 * len(self.arrays[0]))
+            grown = tuple(np.empty(capacity) for _ in range(4))
+            for old, new in zip(self.arrays, grown):
+                new[:first] = old[:first]
+            self.arrays = grown
+        for a, new in zip(self.arrays, level):
+            a[first:end] = new
+        self.size = end
+
+
+class MinMaxPyramid:
+    """Level of detail for a growing time series.
+
+    Level ``k`` keeps, for every bucket of ``2**(k+1)`` samples, the minimum
+    and the maximum together with the time at which each occurs. New
+    samples only touch the tail of each level, so keeping the pyramid
+    current costs O(new samples) and :meth:`points` returns at most
+    *max_points* points whatever the length of the series, without losing
+    peaks.
+    """
+
+    def __init__(self: object, max_points: int = 2000) -> None:
+        self._max_points = max(int(max_points), 4)
+        self._levels = []
+        self._n = 0
+
+    def __len__(self: object) -> int:
+        return self._n
+
+    def update(self: object, t: np.ndarray, y: np.ndarray) -> None:
+        n = len(y)
+        if n < self._n:
+            # The series was reset
+            self._levels, self._n = [], 0
+        if n == self._n:
+            return
+
+        # Recompute from the first bucket the new samples fall into
+        changed = self._n - (self._n % 2)
+        size, self._n = n, n
+
+        k = 0
+        while size > self._max_points // 2:
+            if k == len(self._levels):
+                # A new level is built from the whole level below it
+                self._levels.append(_Level())
+                changed = 0
+            if k == 0:
+                tt = np.asarray(t[changed:n])
+                yy = np.asarray(y[changed:n])
+                prev = (tt, yy, tt, yy)
+            else:
+                prev = self._levels[k - 1].view(changed)
+            changed = self._reduce(self._levels[k], prev, changed)
+            size = (size + 1) // 2
+            k += 1
+
+    @staticmethod
+    def _reduce(level: _Level, prev: tuple, changed: int) -> int:
+        # prev holds the entries of the level below from index changed on,
+        # which always starts on a bucket boundary of this level
+        tlo, lo, thi, hi = prev
+        if len(lo) % 2:
+            tlo, lo = np.append(tlo, tlo[-1]), np.append(lo, lo[-1])
+            thi, hi = np.append(thi, thi[-1]), np.append(hi, hi[-1])
+
+        pick_lo = lo[1::2] < lo[0::2]
+        pick_hi = hi[1::2] > hi[0::2]
+        first = changed // 2
+        level.write(first, (np.where(pick_lo, tlo[1::2], tlo[0::2]),
+                            np.where(pick_lo, lo[1::2], lo[0::2]),
+                            np.where(pick_hi, thi[1::2], thi[0::2]),
+                            np.where(pick_hi, hi[1::2], hi[0::2])))
+
+        # The level above must restart on one of its own bucket boundaries
+        return first - (first % 2)
+
+    def points(self: object, t: np.ndarray,
+               y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Points to plot for the series *(t, y)* last passed to
+        :meth:`update`."""
+        level = next((lv for lv in self._levels
+                      if lv.size <= self._max_points // 2), None)
+        if level is None:
+            return t[:self._n], y[:self._n]
+
+        tlo, lo, thi, hi = level.view()
+        first = tlo <= thi
+        ts = np.empty(2 * len(lo))
+        ys = np.empty(2 * len(lo))
+        ts[0::2] = np.where(first, tlo, thi)
+        ys[0::2] = np.where(first, lo, hi)
+        ts[1::2] = np.where(first, thi, tlo)
+        ys[1::2] = np.where(first, hi, lo)
+        return ts, ys
+
+
+def stride(n: int, max_points: int) -> int:
+    """Power of two sampling stride that keeps *n* samples under
+    *max_points*; powers of two keep the kept samples stable as the series
+    grows."""
+    s = 1
+    while n > s * max_points:
+        s *= 2
+    return s
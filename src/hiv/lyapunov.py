@@ -0,0 +1,88 @@
+import numpy as np
+
+from .regimes import FIXED, PERIODIC, CHAOTIC, DIVERGED, REGIMES
+from .simulators import VirusSimulator, VirusIterator
+
+
+def _jacobian(sim: VirusSimulator, x: np.ndarray, v: np.ndarray,
+              z: np.ndarray) -> np.ndarray:
+    return sim._model.jacobian(x, v, z, sim._svi(v))
+
+
+def lyapunov(sim: VirusSimulator, n_steps: int, exponents: int = None,
+             transient: int = 0, renorm: int = 10) -> np.ndarray:
+    """Lyapunov exponents along the trajectory of a fixed step *sim*.
+
+    The simulator is advanced with its own integrator while a set of
+    tangent vectors follows the variational equations dQ/dt = J(y) Q (an
+    RK4 step with the Jacobian taken at both ends and at the midpoint of
+    every step; for a :class:`VirusIterator` the map Jacobian is applied
+    directly). The tangent vectors are re-orthonormalised with a QR
+    decomposition every *renorm* steps. Works unchanged on ensembles, in
+    which case the result has one row per member; members stopped by a
+    terminal event have no exponents and get NaN rows.
+
+    *exponents* selects how many of the largest exponents to follow (all of
+    them by default). The first *transient* steps are discarded. Exponents
+    of flows are per unit time, those of the iterator per iteration.
+    """
+    if transient > 0:
+        sim.run(transient, every=transient)
+    if sim.finished:
+        raise Exception("The simulator has finished, reset() it first")
+
+    x, v, z, t = sim._head()
+    dim = 2 * sim._mutants + 1
+    k = dim if exponents is None else exponents
+    batch = np.shape(x)[:-1]
+    q = np.broadcast_to(np.eye(dim)[:, :k], batch + (dim, k)).copy()
+    logs = np.zeros(batch + (k,))
+    h = sim._step
+    discrete = isinstance(sim, VirusIterator)
+
+    with np.errstate(all="ignore"):
+        j0 = _jacobian(sim, x, v, z)
+        for i in range(1, n_steps + 1):
+            x1, v1, z1 = sim._advance(x, v, z)
+            j1 = _jacobian(sim, x1, v1, z1)
+
+            if discrete:
+                q = j0 @ q
+            else:
+                jm = _jacobian(sim, (x + x1) / 2, (v + v1) / 2, (z + z1) / 2)
+                k1 = j0 @ q
+                k2 = jm @ (q + (h / 2) * k1)
+                k3 = jm @ (q + (h / 2) * k2)
+                k4 = j1 @ (q + h * k3)
+                q = q + (h / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+            if i % renorm == 0 or i == n_steps:
+                finite = np.isfinite(q).all(axis=(-2, -1))
+                q[~finite] = np.nan
+                q[finite], r = np.linalg.qr(q[finite])
+                logs[finite] += np.log(np.abs(
+                    np.diagonal(r, axis1=-2, axis2=-1)))
+                logs[~finite] = np.nan
+
+            x, v, z, j0 = x1, v1, z1, j1
+
+    sim._append(x, v, z, t + n_steps * h)
+    sim.dirty = True
+    logs /= n_steps if discrete else n_steps * h
+    if getattr(sim, "_rows", None) is None:
+        return logs
+    exponents = np.full((len(sim), k), np.nan)
+    exponents[sim._members_of(np.arange(len(logs)))] = logs
+    return exponents
+
+
+def classify(exponents: np.ndarray, tol: float = 1e-3) -> np.ndarray:
+    """Regime label of a flow from its largest Lyapunov exponent (first
+    entry on the last axis): negative means a fixed point, zero a periodic
+    orbit and positive chaos. Attracting cycles of the iterator map also
+    have negative exponents, so only the chaotic label carries over."""
+    lead = np.asarray(exponents)[..., 0]
+    label = np.where(lead > tol, CHAOTIC,
+                     np.where(lead < -tol, FIXED, PERIODIC))
+    label[~np.isfinite(lead)] = DIVERGED
+    return label
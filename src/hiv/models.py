@@ -1,12 +1,20 @@
-import sympy as sym
+import numpy as np
+
+from . import codegen
 
 
 class GenericVirusModel:
+    PARAMETERS = ("r", "p", "q", "c", "k", "b")
+
     def __init__(self: object, **args) -> None:
-        for p in ["r", "p", "q", "c", "k", "b"]:
+        for p in self.PARAMETERS:
             if p not in args:
                 raise Exception(f"Missing Parameter '{p}'")
         self.args = args
+        self._compiled = None
+        self._work = None
+        self.evaluations = 0
+        self.jacobians = 0
 
     def v(self: object, *args) -> float:
         x, v, z, = args
@@ -25,30 +33,97 @@ class GenericVirusModel:
         z_t = self.args["k"] * svi - self.args["b"] * z
         return z_t
 
-    @staticmethod
-    def solve():
-        xi, vi, z = sym.Symbol("xi"), sym.Symbol("vi"), sym.Symbol("z")
-        r, p, q = sym.Symbol("r"), sym.Symbol("p"), sym.Symbol("q")
-        c, b, k = sym.Symbol("c"), sym.Symbol("b"), sym.Symbol("k")
-        v, u = sym.Symbol("v")
+    @classmethod
+    def solve(cls: type) -> list[dict]:
+        # Fixed points with n identical active mutants, solved symbolically
+        # once per model class
+        return codegen.equilibria(cls, cls.PARAMETERS)
+
+    def _compile(self: object) -> None:
+        self._compiled = codegen.compile_model(self.__class__,
+                                               tuple(self.args))
+        self._params = tuple(self.args[p] for p in self._compiled.PARAMS)
+
+    def rhs(self: object, x: np.ndarray, v: np.ndarray, z: float,
+            svi: float) -> tuple[np.ndarray, np.ndarray, float]:
+        if self._compiled is None:
+            self._compile()
+        self.evaluations += 1
+        return self._compiled.rhs(x, v, z, svi, *self._params)
+
+    def rhs_out(self: object, x: np.ndarray, v: np.ndarray, z: np.ndarray,
+                svi: np.ndarray, out: tuple) -> tuple:
+        """:meth:`rhs` written into the ``(dx, dv, dz)`` arrays *out*. The
+        work buffers are kept for the next call with the same shapes, so
+        repeated calls allocate nothing."""
+        if self._compiled is None:
+            self._compile()
+        if self._compiled.rhs_out is None:
+            # Equations without an in place form
+            for o, d in zip(out, self.rhs(x, v, z, svi)):
+                np.copyto(o, d)
+            return out
+        self.evaluations += 1
+        key = (np.shape(x), np.shape(z))
+        if self._work is None or self._work[0] != key:
+            self._work = (key, [np.empty(np.shape(x) if kind == "x"
+                                         else np.shape(z))
+                                for kind in self._compiled.WORK])
+        return self._compiled.rhs_out(x, v, z, svi, *self._params, out,
+                                      self._work[1])
+
+    def jacobian(self: object, x: np.ndarray, v: np.ndarray, z: float,
+                 svi: float) -> np.ndarray:
+        # State ordering is (x_1..x_M, v_1..v_M, z); leading batch axes of
+        # x and v are kept, so ensembles get one matrix per member. Each
+        # equation only couples the mutants through the virus sum svi.
+        if self._compiled is None:
+            self._compile()
+        self.jacobians += 1
+        (x_x, x_v, x_z, x_s, v_x, v_v, v_z, v_s, _, _, z_z, z_s) = \
+            self._compiled.partials(x, v, z, svi, *self._params)
+        m, batch = np.shape(x)[-1], np.shape(x)[:-1]
+        i = np.arange(m)
+        jac = np.zeros(batch + (2 * m + 1, 2 * m + 1))
+
+        jac[..., :m, m:2 * m] = np.broadcast_to(x_s, batch + (m,))[
+            ..., :, np.newaxis]
+        jac[..., m:2 * m, m:2 * m] = np.broadcast_to(v_s, batch + (m,))[
+            ..., :, np.newaxis]
+        jac[..., i, i] = x_x
+        jac[..., i, m + i] += x_v
+        jac[..., i, 2 * m] = x_z
+        jac[..., m + i, i] = v_x
+        jac[..., m + i, m + i] += v_v
+        jac[..., m + i, 2 * m] = v_z
+        jac[..., 2 * m, m:2 * m] = self._flat(z_s, batch)[..., np.newaxis]
+        jac[..., 2 * m, 2 * m] = self._flat(z_z, batch)
+        return jac
 
-        return (sym.solve(-vi * (r - (p * xi) - (q * z))),
-                sym.solve(- (c * vi) - (b * xi)),
-                sym.solve((k * v) - (b * z), z))
+    def __getstate__(self: object) -> dict:
+        # Generated modules do not pickle; they are rebuilt from the cache
+        return {"args": self.args}
 
-    def __call__(self: object, *args) -> tuple[float, float, float]:
-        return self.x(args), self.v(args), self.z(args)
+    def __setstate__(self: object, state: dict) -> None:
+        self.args = state["args"]
+        self._compiled = None
+        self._work = None
+        self.evaluations = 0
+        self.jacobians = 0
+
+    @staticmethod
+    def _flat(a: np.ndarray, batch: tuple[int, ...]) -> np.ndarray:
+        return np.broadcast_to(a, batch + (1,))[..., 0]
+
+    def __call__(self: object, *args) -> tuple[np.ndarray, np.ndarray, float]:
+        return self.rhs(*args)
 
     def __repr__(self: object) -> float:
         return f"{self.__class__.__name__}({self.args})"
 
 
 class HIVModel(GenericVirusModel):
-    def __init__(self: object, **args) -> None:
-        super(HIVModel, self).__init__(**args)
-        if "u" not in args:
-            raise Exception("Missing Parameter 'u'")
-        self.args = args
+    PARAMETERS = GenericVirusModel.PARAMETERS + ("u",)
 
     def x(self: object, *args) -> float:
         x, v, _, svi = args
@@ -63,14 +138,3 @@ class HIVModel(GenericVirusModel):
             - (self.args["b"] * z) \
             - (self.args["u"] * svi * z)
         return z_t
-
-    @staticmethod
-    def solve():
-        xi, vi, z = sym.Symbol("xi"), sym.Symbol("vi"), sym.Symbol("z")
-        r, p, q = sym.Symbol("r"), sym.Symbol("p"), sym.Symbol("q")
-        c, b, k = sym.Symbol("c"), sym.Symbol("b"), sym.Symbol("k")
-        v, u = sym.Symbol("v"), sym.Symbol("u")
-
-        return (sym.solve(- vi * (r - (p * xi) - (q * z))),
-                sym.solve(- (c * vi) - (b * xi) - (u * v * xi)),
-                sym.solve((k * v) - (b * z) - (u * v * z)))
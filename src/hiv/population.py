@@ -0,0 +1,121 @@
+import numpy as np
+
+from .models import GenericVirusModel
+from .simulators import (VirusSimulator, VirusEulerSimulator,
+                         VirusHeunSimulator, VirusRK4Simulator)
+from .trajectory import SparseTrajectory
+
+
+class VirusPopulation(VirusSimulator):
+    """Virus model whose mutants appear and go extinct over time.
+
+    Only live mutants are part of the state, so a step costs the live
+    mutants whatever the number seen before. A mutant whose viral load
+    falls to *extinction* or below is compacted away after the step: its
+    ``v`` would stay zero and its ``x`` feeds back into nothing else, so
+    only the sub-threshold ``v`` leaves the viral sum. New mutants join
+    through :meth:`add_mutants`, or through *mutation*, called after every
+    step as ``mutation(t, x, v, z)`` and returning the ``(x, v)`` arrays of
+    the newcomers (or None). Like event functions, *mutation* has to pickle
+    for checkpoints to be written.
+
+    Every mutant gets its own id, and the samples go to a
+    :class:`SparseTrajectory` that stores each mutant over its lifetime
+    only (see :meth:`lifetime`).
+    """
+
+    def __init__(self: object, model: GenericVirusModel,
+                 x: list[float], v: list[float], z: float,
+                 step: float = 0.1, start: float = 0.0,
+                 capacity: int = 1024, extinction: float = 1e-9,
+                 mutation=None) -> None:
+        super(VirusPopulation, self).__init__(
+            model, x, v, z, step=step, start=start,
+            trajectory=SparseTrajectory(capacity=capacity))
+        self._extinction = extinction
+        self._mutation = mutation
+        self._ids = self._trajectory.ids.copy()
+        self._next_id = len(self._ids)
+
+    @property
+    def ids(self: object) -> np.ndarray:
+        """Ids of the live mutants, in state order."""
+        return self._ids
+
+    def lifetime(self: object, mutant: int) -> tuple[np.ndarray, np.ndarray,
+                                                     np.ndarray]:
+        return self._trajectory.lifetime(mutant)
+
+    def run(self: object, n_steps: int, delta: float = 0.0, *,
+            every: int = 1, checkpoint: str = None,
+            checkpoint_interval: float = 30.0) -> SparseTrajectory:
+        """See :meth:`VirusSimulator.run`. Returns the trajectory itself
+        rather than dense arrays, which would grow with every mutant ever
+        seen."""
+        self._integrate(n_steps, every,
+                        self._autosave(checkpoint, checkpoint_interval))
+        return self._trajectory
+
+    def add_mutants(self: object, x: np.ndarray,
+                    v: np.ndarray) -> np.ndarray:
+        """Add mutants to the current state and return their ids. The
+        extended state is stored as a new sample at the current time."""
+        x0, v0, z, t = self._last
+        x, v = self._joined(x0, v0, x, v)
+        ids = self._ids[len(x0):]
+        self._append(x, v, z, t)
+        return ids
+
+    def reset(self):
+        super(VirusPopulation, self).reset()
+        self._ids = self._trajectory.ids.copy()
+        self._next_id = len(self._ids)
+        self._mutants = len(self._ids)
+
+    def _callbacks(self: object) -> dict[str, object]:
+        callbacks = super(VirusPopulation, self)._callbacks()
+        if self._mutation is not None:
+            callbacks["mutation"] = self._mutation
+        return callbacks
+
+    def _append(self: object, x: np.ndarray, v: np.ndarray,
+                z: float, t: float) -> None:
+        self._trajectory.append(x, v, z, t, self._ids)
+        self.dirty = True
+
+    def _joined(self: object, x: np.ndarray, v: np.ndarray,
+                x_new: np.ndarray, v_new: np.ndarray) -> tuple[np.ndarray,
+                                                               np.ndarray]:
+        ids = np.arange(self._next_id, self._next_id + len(x_new))
+        self._next_id += len(x_new)
+        self._ids = np.concatenate((self._ids, ids))
+        self._mutants = len(self._ids)
+        return (np.concatenate((x, np.asarray(x_new, dtype=float))),
+                np.concatenate((v, np.asarray(v_new, dtype=float))))
+
+    def _after_step(self: object, t: float, x: np.ndarray, v: np.ndarray,
+                    z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        # Mutants leave and join between steps, after the events were
+        # checked, so both ends of a step hold the same mutants
+        extinct = v <= self._extinction
+        if extinct.any():
+            alive = ~extinct
+            x, v, self._ids = x[alive], v[alive], self._ids[alive]
+            self._mutants = len(self._ids)
+        if self._mutation is not None:
+            new = self._mutation(t, x, v, z)
+            if new is not None and len(new[0]):
+                x, v = self._joined(x, v, *new)
+        return x, v, z
+
+
+class VirusPopulationEulerSimulator(VirusPopulation, VirusEulerSimulator):
+    pass
+
+
+class VirusPopulationHeunSimulator(VirusPopulation, VirusHeunSimulator):
+    pass
+
+
+class VirusPopulationRK4Simulator(VirusPopulation, VirusRK4Simulator):
+    pass
@@ -0,0 +1,6 @@
+# Regime labels shared by sweep() and the Lyapunov classifier, so a code
+# means the same thing whichever of them produced it. A sweep only sees
+# the amplitude of the viral load and cannot tell periodic orbits from
+# chaos, both are reported as oscillating there.
+FIXED, PERIODIC, CHAOTIC, DIVERGED, OSCILLATING = 0, 1, 2, 3, 4
+REGIMES = ("fixed", "periodic", "chaotic", "diverged", "oscillating")
@@ -1,202 +1,613 @@
+import time
+import pickle
 import simcx
 import numpy as np
 
+from .events import Event, Monitor
 from .models import GenericVirusModel
+from .trajectory import Trajectory
+
+
+def _no_autosave(force: bool = False) -> None:
+    pass
 
 
 class VirusSimulator(simcx.Simulator):
     def __init__(self: object, model: GenericVirusModel,
                  x: list[float], v: list[float], z: list[float],
-                 step: float = 0.1, start: float = 0.0) -> None:
+                 step: float = 0.1, start: float = 0.0,
+                 capacity: int = 1024, trajectory: Trajectory = None) -> None:
         super(VirusSimulator, self).__init__()
         self._model = model
         self._step = step
-        self._x, self._v, self._z = np.array([x]), np.array([v]), np.array([z])
-        self._t = np.array([start])
-        self._mutants = len(self._x[0])
+        self._trajectory = Trajectory(capacity=capacity) \
+            if trajectory is None else trajectory
+        self._trajectory.append(np.asarray(x, dtype=float),
+                                np.asarray(v, dtype=float), z, start)
+        self._mutants = np.shape(self._last[0])[-1]
+        self.events = []
+        self.finished = False
+
+    @property
+    def _x(self: object) -> np.ndarray:
+        return self._trajectory.x
+
+    @property
+    def _v(self: object) -> np.ndarray:
+        return self._trajectory.v
+
+    @property
+    def _z(self: object) -> np.ndarray:
+        return self._trajectory.z
+
+    @property
+    def _t(self: object) -> np.ndarray:
+        return self._trajectory.t
+
+    @property
+    def _last(self: object) -> tuple[np.ndarray, np.ndarray, float, float]:
+        return self._trajectory.last
+
+    @property
+    def _bounds(self: object) -> tuple[tuple, tuple]:
+        return self._trajectory.bounds
+
+    def _append(self: object, x: np.ndarray, v: np.ndarray,
+                z: float, t: float) -> None:
+        self._trajectory.append(x, v, z, t)
+        self.dirty = True
+
+    def _head(self: object) -> tuple[np.ndarray, np.ndarray, float, float]:
+        # State the integration carries on from
+        return self._last
 
     def reset(self):
-        self._x = np.array([self._x[0]])
-        self._v = np.array([self._v[0]])
-        self._z = np.array([self._z[0]])
-        self._t = np.array([self._t[0]])
-
-
-class VirusIterator(VirusSimulator):
-    def step(self, delta=0):
-        x, v = np.array([0.] * self._mutants), np.array([0.] * self._mutants)
-        svi = sum(self._v[-1][i] for i in range(self._mutants))
+        self._trajectory.reset()
+        self.finished = False
+        self.dirty = True
+
+    def add_event(self: object, event, terminal: bool = False,
+                  direction: int = 0) -> Event:
+        """Watch *event*, an :class:`Event` or a plain ``g(t, x, v, z)``
+        function, during :meth:`run`, :meth:`run_until` and :meth:`step`.
+        Once a terminal event fired the simulator is :attr:`finished` and
+        stays put until :meth:`reset`. Events are part of checkpoints, so
+        runs that write them need picklable functions: module level ones
+        or :func:`functools.partial` of them, not lambdas."""
+        if not isinstance(event, Event):
+            event = Event(event, terminal=terminal, direction=direction)
+        self.events.append(event)
+        return event
 
-        for i in range(self._mutants):
-            x[i] = self._model.x(self._x[-1][i],
-                                 self._v[-1][i],
-                                 self._z[-1], svi)
+    def step(self: object, delta: float = 0.0) -> None:
+        self._integrate(1, 1, _no_autosave)
+
+    def run(self: object, n_steps: int, delta: float = 0.0, *,
+            every: int = 1, checkpoint: str = None,
+            checkpoint_interval: float = 30.0) -> tuple[np.ndarray,
+                                                        np.ndarray,
+                                                        np.ndarray,
+                                                        np.ndarray]:
+        """Advance *n_steps* steps of the fixed step size (*delta* is
+        ignored, as in :meth:`step`), storing every *every*-th state. With
+        *checkpoint*, a snapshot is also written there at most every
+        *checkpoint_interval* seconds and when the run ends (see
+        :meth:`simcx.Simulator.checkpoint`). Every snapshot of an in-memory
+        :class:`Trajectory` rewrites the whole stored history, so long
+        checkpointed runs should store to a :class:`NpyTrajectory`, whose
+        snapshots only hold the position in its files."""
+        self._integrate(n_steps, every,
+                        self._autosave(checkpoint, checkpoint_interval))
+        return self._t, self._x, self._v, self._z
+
+    def _integrate(self: object, n_steps: int, every: int,
+                   autosave) -> None:
+        if self.finished:
+            return
+        x, v, z, t = self._head()
+        monitor = Monitor(self, t, x, v, z) if self.events else None
+        finished = False
+        for i in range(1, n_steps + 1):
+            x1, v1, z1 = self._advance(x, v, z)
+            t1 = t + self._step
+            if monitor is not None:
+                t1, (x1, v1, z1), finished = monitor.check(
+                    t, (x, v, z), t1, (x1, v1, z1))
+            x, v, z, t = *self._after_step(t1, x1, v1, z1), t1
+            # The last state is always kept so that stepping resumes from it
+            if i % every == 0 or i == n_steps or finished:
+                self._append(x, v, z, t)
+                autosave()
+            if finished:
+                break
+        autosave(force=True)
+        self.dirty = True
+
+    def run_until(self: object, t_end: float, delta: float = 0.0, *,
+                  every: int = 1, checkpoint: str = None,
+                  checkpoint_interval: float = 30.0) -> tuple[np.ndarray,
+                                                              np.ndarray,
+                                                              np.ndarray,
+                                                              np.ndarray]:
+        n_steps = int(np.ceil((t_end - self._last[3]) / self._step - 1e-9))
+        return self.run(max(n_steps, 0), every=every, checkpoint=checkpoint,
+                        checkpoint_interval=checkpoint_interval)
+
+    def _after_step(self: object, t: float, x: np.ndarray, v: np.ndarray,
+                    z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        # State carried on from after a step, once its events were checked;
+        # subclasses may change it between steps
+        return x, v, z
+
+    def _autosave(self: object, path: str, interval: float):
+        # Only called right after a state was stored, so a snapshot always
+        # ends on the state the integration resumes from
+        if path is None:
+            return _no_autosave
+        self._check_picklable()
+        last = time.monotonic()
+
+        def autosave(force: bool = False) -> None:
+            nonlocal last
+            if force or time.monotonic() - last >= interval:
+                self.checkpoint(path)
+                last = time.monotonic()
+        return autosave
+
+    def _callbacks(self: object) -> dict[str, object]:
+        # User supplied functions that go into checkpoints
+        return {repr(event): event._fn for event in self.events}
+
+    def _check_picklable(self: object) -> None:
+        # Fail before the run rather than at its first checkpoint
+        for name, fn in self._callbacks().items():
+            try:
+                pickle.dumps(fn)
+            except Exception as e:
+                raise Exception(f"{name} cannot be checkpointed, its "
+                                f"function does not pickle ({e})") from e
+
+    def counters(self: object) -> dict[str, int]:
+        return {"rhs": self._model.evaluations,
+                "jacobian": self._model.jacobians}
+
+    def _interpolant(self: object, t0: float, state0: tuple, t1: float,
+                     state1: tuple):
+        """The solution over the step from *t0* to *t1* as a function of
+        the fraction of the step, used to locate events. A cubic Hermite
+        interpolant on the derivatives at both ends by default."""
+        h = t1 - t0
+        f0 = self._model.rhs(*state0, self._svi(state0[1]))
+        f1 = self._model.rhs(*state1, self._svi(state1[1]))
+
+        def interpolant(s: np.ndarray) -> tuple:
+            s = np.reshape(s, np.shape(s) + (1,))
+            h00 = (1 + 2 * s) * (1 - s) ** 2
+            h10 = s * (1 - s) ** 2
+            h01 = s ** 2 * (3 - 2 * s)
+            h11 = s ** 2 * (s - 1)
+            return tuple(np.reshape(h00 * a + h10 * h * da +
+                                    h01 * b + h11 * h * db, np.shape(a))
+                         for a, da, b, db in zip(state0, f0, state1, f1))
+        return interpolant
+
+    def _terminate(self: object, stop: np.ndarray, t1: float, state1: tuple,
+                   t_stop: np.ndarray, state_stop: tuple) -> tuple:
+        # A terminal event ends the whole run at the crossing
+        self.finished = True
+        return float(t_stop), state_stop, True
+
+    def _svi(self: object, v: np.ndarray, out: np.ndarray = None) -> float:
+        return np.sum(v, out=out)
+
+    def _advance(self: object, x: np.ndarray, v: np.ndarray,
+                 z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        assert False, "Not implemented!"
 
-            v[i] = self._model.v(self._x[-1][i],
-                                 self._v[-1][i],
-                                 self._z[-1])
 
-        z = self._model.z(0, 0, self._z[-1], svi)
-        t = self._t[-1] + self._step
+class VirusIterator(VirusSimulator):
+    def _advance(self, x, v, z):
+        svi = self._svi(v)
+        return self._model.rhs(x, v, z, svi)
 
-        self._x = np.concatenate((self._x, [x]), axis=0)
-        self._v = np.concatenate((self._v, [v]), axis=0)
-        self._z = np.concatenate((self._z, [z]), axis=0)
-        self._t = np.concatenate((self._t, [t]), axis=0)
+    def _interpolant(self, t0, state0, t1, state1):
+        # A map has nothing in between, events fire at the iterate itself
+        return None
 
 
 class VirusEulerSimulator(VirusSimulator):
-    def step(self: object, delta: float = 0.0) -> None:
-        x, v = np.array([0.] * self._mutants), np.array([0.] * self._mutants)
-        svi = sum(self._v[-1][i] for i in range(self._mutants))
-
-        for i in range(self._mutants):
-            x[i] = self._x[-1][i] + \
-                self._model.x(self._x[-1][i],
-                              self._v[-1][i],
-                              self._z[-1], svi) * self._step
-
-            v[i] = self._v[-1][i] + \
-                self._model.v(self._x[-1][i],
-                              self._v[-1][i],
-                              self._z[-1]) * self._step
+    def _advance(self: object, x: np.ndarray, v: np.ndarray,
+                 z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        svi = self._svi(v)
+        dx, dv, dz = self._model.rhs(x, v, z, svi)
 
-        z = self._z[-1] + self._model.z(0, 0, self._z[-1], svi) * self._step
-        t = self._t[-1] + self._step
-
-        self._x = np.concatenate((self._x, [x]), axis=0)
-        self._v = np.concatenate((self._v, [v]), axis=0)
-        self._z = np.concatenate((self._z, [z]), axis=0)
-        self._t = np.concatenate((self._t, [t]), axis=0)
+        return (x + dx * self._step,
+                v + dv * self._step,
+                z + dz * self._step)
 
 
 class VirusHeunSimulator(VirusSimulator):
-    def step(self: object, delta: float = 0.0) -> None:
-        k1x, k1v = np.array(
-            [0.] * self._mutants), np.array([0.] * self._mutants)
-
-        svi = sum(self._v[-1][i] for i in range(self._mutants))
-        k1z = self._z[-1] + self._model.z(0, 0, self._z[-1], svi) * self._step
-
-        for i in range(self._mutants):
-            k1x[i] = self._x[-1][i] + \
-                self._model.x(self._x[-1][i],
-                              self._v[-1][i],
-                              self._z[-1], svi) * self._step
-
-            k1v[i] = self._v[-1][i] + \
-                self._model.v(self._x[-1][i],
-                              self._v[-1][i],
-                              self._z[-1]) * self._step
+    def _advance(self: object, x: np.ndarray, v: np.ndarray,
+                 z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        svi = self._svi(v)
+        f1x, f1v, f1z = self._model.rhs(x, v, z, svi)
 
-        x, v = np.array([0.] * self._mutants), np.array([0.] * self._mutants)
-        sv1i = sum(k1v)
+        k1x = x + f1x * self._step
+        k1v = v + f1v * self._step
+        k1z = z + f1z * self._step
 
-        for i in range(self._mutants):
-            x[i] = self._x[-1][i] + \
-                ((self._step / 2) * self._model.x(self._x[-1][i],
-                                                  self._v[-1][i],
-                                                  self._z[-1], svi)) + \
-                ((self._step / 2) * self._model.x(k1x[i], k1v[i], k1z, sv1i))
+        sv1i = self._svi(k1v)
+        f2x, f2v, f2z = self._model.rhs(k1x, k1v, k1z, sv1i)
 
-            v[i] = self._v[-1][i] + \
-                ((self._step / 2) * self._model.v(self._x[-1][i],
-                                                  self._v[-1][i],
-                                                  self._z[-1])) + \
-                ((self._step / 2) * self._model.v(k1x[i], k1v[i], k1z))
-
-        z = self._z[-1] + \
-            ((self._step / 2) * self._model.z(0, 0, self._z[-1], svi)) +\
-            ((self._step / 2) * self._model.z(0, 0, k1z, sv1i))
-
-        t = self._t[-1] + self._step
-
-        self._x = np.concatenate((self._x, [x]), axis=0)
-        self._v = np.concatenate((self._v, [v]), axis=0)
-        self._z = np.concatenate((self._z, [z]), axis=0)
-        self._t = np.concatenate((self._t, [t]), axis=0)
+        return (x + ((self._step / 2) * f1x) + ((self._step / 2) * f2x),
+                v + ((self._step / 2) * f1v) + ((self._step / 2) * f2v),
+                z + ((self._step / 2) * f1z) + ((self._step / 2) * f2z))
 
 
 class VirusRK4Simulator(VirusSimulator):
-    def step(self: object, delta: float = 0) -> None:
-        # K1 Calculation
-        k1x, k1v = np.array(
-            [0.] * self._mutants), np.array([0.] * self._mutants)
+    def _advance(self: object, x: np.ndarray, v: np.ndarray,
+                 z: float) -> tuple[np.ndarray, np.ndarray, float]:
+        # All stages are evaluated into buffers kept between steps, each
+        # holding x, v and z one after the other: the stage state s, the
+        # derivative d and the weighted sum of the derivatives a. The new
+        # state goes to one of two result buffers, used in turn, so callers
+        # may keep the previous state around but no older one.
+        h, rhs_out, svi_of = self._step, self._model.rhs_out, self._svi
+        y, s, d, a, svi, result = self._buffers(x, v, z)
 
-        svi = sum(self._v[-1][i] for i in range(self._mutants))
-        k1z = self._model.z(0, 0, self._z[-1], svi) * self._step
-
-        for i in range(self._mutants):
-            k1x[i] = self._model.x(self._x[-1][i],
-                                   self._v[-1][i],
-                                   self._z[-1], svi) * self._step
-
-            k1v[i] = self._model.v(self._x[-1][i],
-                                   self._v[-1][i],
-                                   self._z[-1]) * self._step
-
-        # K2 Calculation
-        k2x, k2v = np.array(
-            [0.] * self._mutants), np.array([0.] * self._mutants)
-
-        sv2i = sum(k1v)
-        k2z = self._model.z(0, 0, self._z[-1] + 0.5 * k1z, sv2i) * self._step
-
-        for i in range(self._mutants):
-            k2x[i] = self._model.x(self._x[-1][i] + 0.5 * k1x[i],
-                                   self._v[-1][i] + 0.5 * k1v[i],
-                                   self._z[-1] + 0.5 * k1z, sv2i)\
-                * self._step
-
-            k2v[i] = self._model.v(self._x[-1][i] + 0.5 * k1x[i],
-                                   self._v[-1][i] + 0.5 * k1v[i],
-                                   self._z[-1] + 0.5 * k1z) * self._step
-
-        # K3 Calculation
-        k3x, k3v = np.array(
-            [0.] * self._mutants), np.array([0.] * self._mutants)
-
-        sv3i = sum(k2v)
-        k3z = self._model.z(0, 0, self._z[-1] + 0.5 * k2z, sv3i) * self._step
-
-        for i in range(self._mutants):
-            k3x[i] = self._model.x(self._x[-1][i] + 0.5 * k2x[i],
-                                   self._v[-1][i] + 0.5 * k2v[i],
-                                   self._z[-1] + 0.5 * k2z, sv3i)\
-                * self._step
-
-            k3v[i] = self._model.v(self._x[-1][i] + 0.5 * k2x[i],
-                                   self._v[-1][i] + 0.5 * k2v[i],
-                                   self._z[-1] + 0.5 * k2z) * self._step
-
-        # K4 Calculation
-        k4x, k4v = np.array(
-            [0.] * self._mutants), np.array([0.] * self._mutants)
+        # K1 Calculation
+        rhs_out(x, v, z, svi_of(v, svi), d[1])
+        np.copyto(a, d[0])
+
+        # K2, K3 and K4 Calculation, from y + c * h * d of the last stage
+        for c, weight in ((0.5, 2), (0.5, 2), (1.0, 1)):
+            np.multiply(d[0], c * h, out=s[0])
+            np.add(s[0], y, out=s[0])
+            rhs_out(*s[1], svi_of(s[1][1], svi), d[1])
+            if weight != 1:
+                np.multiply(d[0], weight, out=s[0])
+                np.add(a, s[0], out=a)
+            else:
+                np.add(a, d[0], out=a)
 
-        sv4i = sum(k3v)
-        k4z = self._model.z(0, 0, self._z[-1] + k3z, sv4i) * self._step
+        # Final Result
+        np.multiply(a, h / 6, out=a)
+        np.add(y, a, out=result[0])
+        return result[1]
+
+    def _buffers(self: object, x: np.ndarray, v: np.ndarray,
+                 z: float) -> tuple:
+        # Buffers are (packed array, (x, v, z) views of it) pairs
+        key = (np.shape(x), np.shape(z))
+        buffers = self.__dict__.get("_rk4_buffers")
+        if buffers is None or buffers[0] != key:
+            n = np.size(x)
+
+            def packed():
+                y = np.empty(2 * n + np.size(z))
+                return y, (y[:n].reshape(np.shape(x)),
+                           y[n:2 * n].reshape(np.shape(x)),
+                           y[2 * n:].reshape(np.shape(z)))
+            buffers = (key, packed(), packed(), packed(),
+                       np.empty(np.shape(self._svi(v))), [packed(), packed()])
+            self._rk4_buffers = buffers
+        _, s, d, a, svi, results = buffers
+        # The state usually is the last result, the step then goes to the
+        # other one. Any other state is copied into that other one and
+        # the step is made in place.
+        results.reverse()
+        y, result = results
+        if y[1][0] is not x:
+            y = result
+            for to, state in zip(y[1], (x, v, z)):
+                np.copyto(to, state)
+        return y[0], s, d, a[0], svi, result
+
+    def __getstate__(self: object) -> dict:
+        # Scratch buffers are rebuilt by the next step
+        state = self.__dict__.copy()
+        state.pop("_rk4_buffers", None)
+        return state
+
+
+class VirusRK45Simulator(VirusSimulator):
+    # Dormand-Prince 5(4) tableau, its embedded error weights and the
+    # coefficients of the 4th order dense output polynomial.
+    C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+    A = [np.array([]),
+         np.array([1/5]),
+         np.array([3/40, 9/40]),
+         np.array([44/45, -56/15, 32/9]),
+         np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+         np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656])]
+    B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+    E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200,
+                  -22/525, 1/40])
+    P = np.array([
+        [1, -8048581381/2820520608, 8663915743/2820520608,
+         -12715105075/11282082432],
+        [0, 0, 0, 0],
+        [0, 131558114200/32700410799, -68118460800/10900136933,
+         87487479700/32700410799],
+        [0, -1754552775/470086768, 14199869525/1410260304,
+         -10690763975/1880347072],
+        [0, 127303824393/49829197408, -318862633887/49829197408,
+         701980252875/199316789632],
+        [0, -282668133/205662961, 2019193451/616988883,
+         -1453857185/822651844],
+        [0, 40617522/29380423, -110615467/29380423,
+         69997945/29380423]])
 
-        for i in range(self._mutants):
-            k4x[i] = self._model.x(self._x[-1][i] + k3x[i],
-                                   self._v[-1][i] + k3v[i],
-                                   self._z[-1] + k3z, sv4i) * self._step
+    def __init__(self: object, model: GenericVirusModel,
+                 x: list[float], v: list[float], z: list[float],
+                 step: float = 0.1, start: float = 0.0,
+                 capacity: int = 1024, trajectory: Trajectory = None,
+                 rtol: float = 1e-6, atol: float = 1e-9,
+                 max_step: float = np.inf) -> None:
+        super(VirusRK45Simulator, self).__init__(model, x, v, z, step=step,
+                                                 start=start,
+                                                 capacity=capacity,
+                                                 trajectory=trajectory)
+        self._rtol = rtol
+        self._atol = atol
+        self._max_step = max_step
+        self._h = step
+        self._f0 = None
+        self._dense = None
+        self.rejected = 0
+        self.stiffness = 0.0
 
-            k4v[i] = self._model.v(self._x[-1][i] + k3x[i],
-                                   self._v[-1][i] + k3v[i],
-                                   self._z[-1] + k3z) * self._step
+    def reset(self):
+        super(VirusRK45Simulator, self).reset()
+        self._h = self._step
+        self._f0 = None
+        self._dense = None
+        self.rejected = 0
+        self.stiffness = 0.0
+
+    def _pack(self: object, x: np.ndarray, v: np.ndarray,
+              z: float) -> np.ndarray:
+        return np.concatenate((x, v, np.reshape(z, np.shape(x)[:-1] + (1,))),
+                              axis=-1)
+
+    def _unpack(self: object,
+                y: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+        m = self._mutants
+        z = y[..., 2 * m:].reshape(np.shape(self._last[2]))
+        return y[..., :m], y[..., m:2 * m], z
+
+    def _f(self: object, y: np.ndarray) -> np.ndarray:
+        m = self._mutants
+        x, v, z = y[..., :m], y[..., m:2 * m], y[..., 2 * m:]
+        dx, dv, dz = self._model.rhs(x, v, z, self._svi(v))
+        return np.concatenate((dx, dv, np.broadcast_to(dz, z.shape)),
+                              axis=-1)
+
+    def _adaptive_step(self: object, t: float, y: np.ndarray,
+                       t_end: float = np.inf) -> tuple[float, np.ndarray]:
+        f0 = self._f(y) if self._f0 is None else self._f0
+        k = np.empty((7,) + y.shape)
+        k[0] = f0
+
+        while True:
+            h = min(self._h, self._max_step, t_end - t)
+            for s in range(1, 6):
+                y_stage = y + np.tensordot(self.A[s], k[:s], axes=1) * h
+                k[s] = self._f(y_stage)
+            y_new = y + h * np.tensordot(self.B, k[:6], axes=1)
+            k[6] = self._f(y_new)
+
+            scale = self._atol + self._rtol * np.maximum(np.abs(y),
+                                                         np.abs(y_new))
+            error = h * np.tensordot(self.E, k, axes=1) / scale
+            norm = np.sqrt(np.mean(error ** 2))
+
+            if norm < 1:
+                factor = 10 if norm == 0 else min(10, 0.9 * norm ** -0.2)
+                # A step clipped to land on t_end must not shrink the next one
+                self._h = max(self._h, h * factor) if h < self._h \
+                    else h * factor
+                break
+
+            self._h = h * max(0.2, 0.9 * norm ** -0.2)
+            self.rejected += 1
+            if t + self._h == t:
+                raise Exception(f"Step size underflow at t={t}")
+
+        # Hairer's estimate of h * |lambda| from the last two stages; the
+        # explicit method is stability bound once this nears 3.3
+        dy = np.sum((y_new - y_stage) ** 2)
+        self.stiffness = h * np.sqrt(np.sum((k[6] - k[5]) ** 2) / dy) \
+            if dy > 0 else 0.0
+
+        self._f0 = k[6]
+        self._dense = (self._dormand_prince_dense, t, h, y, k.copy())
+        return t + h, y_new
+
+    def _dormand_prince_dense(self: object, t: float, t0: float, h: float,
+                              y0: np.ndarray, k: np.ndarray) -> np.ndarray:
+        p = ((t - t0) / h) ** np.arange(1, 5)
+        return y0 + h * np.tensordot(self.P @ p, k, axes=1)
+
+    def interpolate(self: object,
+                    t: float) -> tuple[np.ndarray, np.ndarray, float]:
+        """Dense output: evaluate the solution at time *t* inside the last
+        accepted step."""
+        dense, *args = self._dense
+        return self._unpack(dense(t, *args))
+
+    def _interpolant(self: object, t0: float, state0: tuple, t1: float,
+                     state1: tuple):
+        # The dense output of the step just taken
+        return lambda s: self.interpolate(t0 + s * (t1 - t0))
+
+    def _check(self: object, monitor: Monitor, t0: float, y0: np.ndarray,
+               t1: float, y1: np.ndarray) -> tuple[float, np.ndarray, bool]:
+        t, state, finished = monitor.check(t0, self._unpack(y0), t1,
+                                           self._unpack(y1))
+        return t, self._pack(*state) if finished else y1, finished
+
+    def _integrate(self: object, n_steps: int, every: int,
+                   autosave) -> None:
+        if self.finished:
+            return
+        x, v, z, t = self._head()
+        monitor = Monitor(self, t, x, v, z) if self.events else None
+        finished = False
+        y = self._pack(x, v, z)
+        for i in range(1, n_steps + 1):
+            t1, y1 = self._adaptive_step(t, y)
+            if monitor is not None:
+                t1, y1, finished = self._check(monitor, t, y, t1, y1)
+            t, y = t1, y1
+            if i % every == 0 or i == n_steps or finished:
+                self._append(*self._unpack(y), t)
+                autosave()
+            if finished:
+                break
+        autosave(force=True)
+        self.dirty = True
+
+    def run_until(self: object, t_end: float, delta: float = 0.0, *,
+                  every: int = 1, t_eval: np.ndarray = None,
+                  checkpoint: str = None,
+                  checkpoint_interval: float = 30.0) -> tuple[np.ndarray,
+                                                              np.ndarray,
+                                                              np.ndarray,
+                                                              np.ndarray]:
+        """Integrate up to exactly *t_end*. With *t_eval*, the stored samples
+        are taken from the dense output at those (increasing) times instead
+        of at the accepted steps; periodic checkpoints then need a stored
+        accepted step and only the final one is written."""
+        if self.finished:
+            return self._t, self._x, self._v, self._z
+        autosave = self._autosave(checkpoint, checkpoint_interval)
+        x, v, z, t = self._head()
+        monitor = Monitor(self, t, x, v, z) if self.events else None
+        finished = False
+        y = self._pack(x, v, z)
+        # Samples at or before the current time are already stored
+        pending = [] if t_eval is None else [s for s in t_eval if s > t]
+        i = 0
+        while t < t_end and not finished:
+            t1, y1 = self._adaptive_step(t, y, t_end)
+            if monitor is not None:
+                t1, y1, finished = self._check(monitor, t, y, t1, y1)
+            t, y = t1, y1
+            i += 1
+            if t_eval is None:
+                if i % every == 0 or t >= t_end or finished:
+                    self._append(*self._unpack(y), t)
+                    autosave()
+                continue
+            while pending and pending[0] <= t:
+                t_sample = pending.pop(0)
+                self._append(*self.interpolate(t_sample), t_sample)
+
+        # The last state is always kept so that stepping resumes from it
+        if self._last[3] != t:
+            self._append(*self._unpack(y), t)
+        autosave(force=True)
+        self.dirty = True
+        return self._t, self._x, self._v, self._z
+
+
+class VirusRosenbrockSimulator(VirusRK45Simulator):
+    """Linearly implicit, L-stable Rosenbrock 2(3) integrator (the scheme
+    behind MATLAB's ode23s), driven by the model's analytic Jacobian. Its
+    step is limited by accuracy only, which suits stiff parameter sets."""
+
+    D = 1 / (2 + np.sqrt(2))
+    E32 = 6 + np.sqrt(2)
+
+    def _jacobian(self: object, y: np.ndarray) -> np.ndarray:
+        m = self._mutants
+        x, v, z = y[..., :m], y[..., m:2 * m], y[..., 2 * m:]
+        return self._model.jacobian(x, v, z, self._svi(v))
+
+    def _adaptive_step(self: object, t: float, y: np.ndarray,
+                       t_end: float = np.inf) -> tuple[float, np.ndarray]:
+        f0 = self._f(y) if self._f0 is None else self._f0
+        jac = self._jacobian(y)
+        eye = np.eye(y.shape[-1])
+
+        def solve(w, b):
+            return np.einsum("...ij,...j->...i", w, b)
+
+        while True:
+            h = min(self._h, self._max_step, t_end - t)
+            # One factorisation per attempt, shared by the three stages
+            w = np.linalg.inv(eye - (h * self.D) * jac)
+
+            k1 = solve(w, f0)
+            f1 = self._f(y + 0.5 * h * k1)
+            k2 = solve(w, f1 - k1) + k1
+            y_new = y + h * k2
+            f2 = self._f(y_new)
+            k3 = solve(w, f2 - self.E32 * (k2 - f1) - 2 * (k1 - f0))
+
+            scale = self._atol + self._rtol * np.maximum(np.abs(y),
+                                                         np.abs(y_new))
+            error = (h / 6) * (k1 - 2 * k2 + k3) / scale
+            norm = np.sqrt(np.mean(error ** 2))
+
+            if norm < 1:
+                factor = 5 if norm == 0 else min(5, 0.9 * norm ** (-1 / 3))
+                self._h = max(self._h, h * factor) if h < self._h \
+                    else h * factor
+                break
+
+            self._h = h * max(0.2, 0.9 * norm ** (-1 / 3))
+            self.rejected += 1
+            if t + self._h == t:
+                raise Exception(f"Step size underflow at t={t}")
+
+        # Bound on h * |lambda| used to decide when to go back to explicit
+        self.stiffness = h * np.max(np.sum(np.abs(jac), axis=-1))
+        self._f0 = f2
+        self._dense = (self._rosenbrock_dense, t, h, y, k1, k2)
+        return t + h, y_new
+
+    def _rosenbrock_dense(self: object, t: float, t0: float, h: float,
+                          y0: np.ndarray, k1: np.ndarray,
+                          k2: np.ndarray) -> np.ndarray:
+        s = (t - t0) / h
+        return y0 + h * ((s * (1 - s) / (1 - 2 * self.D)) * k1 +
+                         (s * (s - 2 * self.D) / (1 - 2 * self.D)) * k2)
+
+
+class VirusAutoSimulator(VirusRosenbrockSimulator):
+    """Switches between Dormand-Prince and Rosenbrock steps depending on
+    the stiffness estimate of the last accepted steps."""
+
+    def __init__(self: object, *args, stiff_limit: float = 3.25,
+                 patience: int = 15, **kwargs) -> None:
+        super(VirusAutoSimulator, self).__init__(*args, **kwargs)
+        self._stiff_limit = stiff_limit
+        self._patience = patience
+        self._streak = 0
+        self.stiff = False
+        self.switches = 0
 
-        # Final Result
-        x, v = np.array([0.] * self._mutants), np.array([0.] * self._mutants)
-        for i in range(self._mutants):
-            x[i] = self._x[-1][i] + \
-                (1/6) * (k1x[i] + 2 * k2x[i] + 2 * k3x[i] + k4x[i])
-            v[i] = self._v[-1][i] + \
-                (1/6) * (k1v[i] + 2 * k2v[i] + 2 * k3v[i] + k4v[i])
-
-        z = self._z[-1] + (1/6) * (k1z + 2 * k2z + 2 * k3z + k4z)
-        t = self._t[-1] + self._step
-
-        self._x = np.concatenate((self._x, [x]), axis=0)
-        self._v = np.concatenate((self._v, [v]), axis=0)
-        self._z = np.concatenate((self._z, [z]), axis=0)
-        self._t = np.concatenate((self._t, [t]), axis=0)
+    def reset(self):
+        super(VirusAutoSimulator, self).reset()
+        self._streak = 0
+        self.stiff = False
+        self.switches = 0
+
+    def _adaptive_step(self: object, t: float, y: np.ndarray,
+                       t_end: float = np.inf) -> tuple[float, np.ndarray]:
+        if self.stiff:
+            t, y = VirusRosenbrockSimulator._adaptive_step(self, t, y, t_end)
+            # The row-sum bound overestimates |lambda|, so ask for margin
+            changed = self.stiffness < 0.5 * self._stiff_limit
+        else:
+            t, y = VirusRK45Simulator._adaptive_step(self, t, y, t_end)
+            changed = self.stiffness > 0.9 * self._stiff_limit
+
+        self._streak = self._streak + 1 if changed else 0
+        if self._streak >= self._patience:
+            self.stiff = not self.stiff
+            self.switches += 1
+            self._streak = 0
+        return t, y
@@ -0,0 +1,205 @@
+import os
+import time
+import hashlib
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from .ensemble import VirusEnsemble, VirusEnsembleRK4Simulator
+from .regimes import FIXED, OSCILLATING, DIVERGED, REGIMES
+
+
+def grid(**axes) -> dict[str, np.ndarray]:
+    """Cartesian product of the given parameter axes, flattened so that
+    every parameter maps to an array with one entry per grid point."""
+    names = list(axes)
+    mesh = np.meshgrid(*(np.atleast_1d(axes[n]) for n in names),
+                       indexing="ij")
+    return {n: m.ravel() for n, m in zip(names, mesh)}
+
+
+def _columns(mutants: int) -> int:
+    # final x, final v, final z, peak viral load, regime label
+    return 2 * mutants + 3
+
+
+def _finite(x: np.ndarray, v: np.ndarray, z: np.ndarray) -> np.ndarray:
+    return np.isfinite(x).all(axis=1) & np.isfinite(v).all(axis=1) \
+        & np.isfinite(z[:, 0])
+
+
+def _simulate(shm_name: str, shape: tuple[int, int], rows: slice,
+              model: type, params: dict[str, np.ndarray],
+              x: np.ndarray, v: np.ndarray, z: np.ndarray,
+              n_steps: int, step: float, integrator: type[VirusEnsemble],
+              tail: int, tol: float, prune_every: int) -> tuple[int, int]:
+    sim = integrator(model(**params), x, v, z, step=step, capacity=1)
+    mutants = sim._mutants
+
+    x, v, z, _ = sim._last
+    svi = sim._svi(v)
+    peak, low, high = svi.copy(), svi.copy(), svi.copy()
+    summary = (peak.copy(), low.copy(), high.copy())
+    with np.errstate(all="ignore"):
+        for i in range(n_steps):
+            x0, v0, z0 = x, v, z
+            x, v, z = sim._advance(x, v, z)
+            svi = sim._svi(v)
+            np.fmax(peak, svi, out=peak)
+            if i == n_steps - tail:
+                low[:], high[:] = svi, svi
+            np.fmin(low, svi, out=low)
+            np.fmax(high, svi, out=high)
+            if not prune_every or (i + 1) % prune_every:
+                continue
+
+            # Members whose state stopped changing stay at that fixed point
+            # and diverged ones stay non-finite: their answer is known, so
+            # they drop out of the ensemble
+            done = ~_finite(x, v, z) | ((x == x0).all(axis=1) &
+                                        (v == v0).all(axis=1) &
+                                        (z == z0)[:, 0])
+            if not done.any():
+                continue
+            if i < n_steps - tail:
+                low[done], high[done] = svi[done], svi[done]
+            members = sim._members_of(np.flatnonzero(done))
+            for out, a in zip(summary, (peak, low, high)):
+                out[members] = a[done]
+            peak, low, high = peak[~done], low[~done], high[~done]
+            x, v, z = sim._drop(done, x, v, z)
+            if sim.finished:
+                break
+
+        members = sim._members_of(np.arange(len(peak)))
+        for out, a in zip(summary, (peak, low, high)):
+            out[members] = a
+        peak, low, high = summary
+        x, v, z = sim._expand(x, v, z)
+        amplitude = (high - low) / (np.abs(high) + np.abs(low) + 1e-300)
+    regime = np.where(amplitude[:, 0] < tol, FIXED, OSCILLATING)
+    regime[~_finite(x, v, z)] = DIVERGED
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=float, buffer=shm.buf)[rows]
+        out[:, :mutants] = x
+        out[:, mutants:2 * mutants] = v
+        out[:, -3] = z[:, 0]
+        out[:, -2] = peak[:, 0]
+        out[:, -1] = regime
+        del out
+    finally:
+        shm.close()
+    return rows.start, rows.stop
+
+
+def _fingerprint(model: type, params: dict[str, np.ndarray], x: np.ndarray,
+                 v: np.ndarray, z: np.ndarray, *settings) -> str:
+    # Identifies the inputs a checkpoint's results were computed from
+    digest = hashlib.sha256()
+    for name in (model.__qualname__, *sorted(params)):
+        digest.update(name.encode() + b"\0")
+    for a in (*(params[p] for p in sorted(params)), x, v, z):
+        digest.update(np.ascontiguousarray(a, dtype=float).tobytes())
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()
+
+
+def _save_checkpoint(path: str, results: np.ndarray, done: np.ndarray,
+                     fingerprint: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, results=results, done=done,
+                 fingerprint=np.array(fingerprint))
+    os.replace(tmp, path)
+
+
+def sweep(model: type, params: dict[str, np.ndarray],
+          x: np.ndarray, v: np.ndarray, z: np.ndarray, n_steps: int,
+          step: float = 0.1, integrator: type[VirusEnsemble] =
+          VirusEnsembleRK4Simulator, chunk_size: int = 256,
+          workers: int = None, checkpoint: str = None,
+          checkpoint_interval: float = 30.0, progress=None,
+          tail: int = 1000, tol: float = 1e-6,
+          prune_every: int = 100) -> dict[str, np.ndarray]:
+    """Run every parameter set in *params* for *n_steps* across a process
+    pool and return per-member summaries.
+
+    Chunks of ``chunk_size`` members are integrated as one ensemble, and
+    workers write their summaries straight into a shared memory block, so
+    trajectories never cross process boundaries. Initial conditions are
+    broadcast over all members. When *checkpoint* is given, finished
+    chunks are saved there periodically and skipped on the next call; a
+    checkpoint left by a run with other inputs or settings is ignored.
+    *progress*, if given, is called as ``progress(done, total)``.
+
+    Every *prune_every* steps (0 disables it), members that diverged or
+    came to rest on a fixed point stop being integrated; the latter give
+    the same summaries as integrating on, diverged members report the
+    non-finite state they were dropped with.
+    """
+    sizes = {len(np.atleast_1d(a)) for a in params.values()}
+    members = max(sizes)
+    if not sizes <= {1, members}:
+        raise Exception("Parameter arrays must share the same length")
+    params = {p: np.broadcast_to(np.asarray(a, dtype=float), (members,))
+              for p, a in params.items()}
+
+    mutants = np.shape(x)[-1]
+    x = np.broadcast_to(np.asarray(x, dtype=float), (members, mutants))
+    v = np.broadcast_to(np.asarray(v, dtype=float), (members, mutants))
+    z = np.broadcast_to(np.asarray(z, dtype=float), (members,))
+    shape = (members, _columns(mutants))
+    tail = max(1, min(tail, n_steps))
+    fingerprint = _fingerprint(model, params, x, v, z, n_steps, step,
+                               integrator.__qualname__, tail, tol,
+                               prune_every, REGIMES)
+
+    done = np.zeros(members, dtype=bool)
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(1, members * shape[1] * 8))
+    try:
+        results = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        results[:] = np.nan
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with np.load(checkpoint) as saved:
+                if "fingerprint" in saved and \
+                        saved["fingerprint"] == fingerprint:
+                    results[:] = saved["results"]
+                    done[:] = saved["done"]
+
+        chunks = [slice(i, min(i + chunk_size, members))
+                  for i in range(0, members, chunk_size)
+                  if not done[i:i + chunk_size].all()]
+
+        last_save = time.monotonic()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate, shm.name, shape, rows, model,
+                                   {p: a[rows] for p, a in params.items()},
+                                   x[rows], v[rows], z[rows], n_steps, step,
+                                   integrator, tail, tol, prune_every)
+                       for rows in chunks]
+            for future in as_completed(futures):
+                start, stop = future.result()
+                done[start:stop] = True
+                if progress is not None:
+                    progress(int(done.sum()), members)
+                if checkpoint is not None and \
+                        time.monotonic() - last_save >= checkpoint_interval:
+                    _save_checkpoint(checkpoint, results, done, fingerprint)
+                    last_save = time.monotonic()
+    finally:
+        # Also reached when a worker fails, so finished chunks survive
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, results, done, fingerprint)
+        results = results.copy()
+        shm.close()
+        shm.unlink()
+
+    return {"x": results[:, :mutants],
+            "v": results[:, mutants:2 * mutants],
+            "z": results[:, -3],
+            "peak": results[:, -2],
+            "regime": results[:, -1].astype(int)}
@@ -0,0 +1,439 @@
+import os
+import struct
+import numpy as np
+
+
+class Trajectory:
+    def __init__(self: object, capacity: int = 1024) -> None:
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._x = self._v = self._z = self._t = None
+        self._lower = self._upper = None
+
+    def __len__(self: object) -> int:
+        return self._size
+
+    @property
+    def x(self: object) -> np.ndarray:
+        return self._x[:self._size]
+
+    @property
+    def v(self: object) -> np.ndarray:
+        return self._v[:self._size]
+
+    @property
+    def z(self: object) -> np.ndarray:
+        return self._z[:self._size]
+
+    @property
+    def t(self: object) -> np.ndarray:
+        return self._t[:self._size]
+
+    @property
+    def last(self: object) -> tuple[np.ndarray, np.ndarray, float, float]:
+        i = self._size - 1
+        return self._x[i], self._v[i], self._z[i], self._t[i]
+
+    @property
+    def bounds(self: object) -> tuple[tuple, tuple]:
+        """Running ``(lower, upper)`` bounds of every sample appended so
+        far, each an ``(x, v, z, t)`` tuple. NaNs are ignored."""
+        return self._lower, self._upper
+
+    def append(self: object, x: np.ndarray, v: np.ndarray,
+               z: float, t: float) -> None:
+        self._track(x, v, z, t)
+        if self._x is None:
+            self._allocate(x, v, z)
+        if self._size == self._capacity:
+            self._grow(2 * self._capacity)
+        self._x[self._size] = x
+        self._v[self._size] = v
+        self._z[self._size] = z
+        self._t[self._size] = t
+        self._size += 1
+
+    def reset(self: object) -> None:
+        self._size = 1
+        self._lower = None
+        self._track(*self.last)
+
+    def _track(self: object, x: np.ndarray, v: np.ndarray,
+               z: float, t: float) -> None:
+        # Updated in place on every append, so bounds never need a rescan
+        sample = (x, v, z, t)
+        if self._lower is None:
+            self._lower = tuple(np.array(a, dtype=float) for a in sample)
+            self._upper = tuple(np.array(a, dtype=float) for a in sample)
+            return
+        for lower, upper, a in zip(self._lower, self._upper, sample):
+            np.fmin(lower, a, out=lower)
+            np.fmax(upper, a, out=upper)
+
+    def __getstate__(self: object) -> dict:
+        # Only the filled part of the buffers is worth saving. That is still
+        # the whole history, which NpyTrajectory avoids for long runs
+        state = self.__dict__.copy()
+        if self._x is not None:
+            for name in ("_x", "_v", "_z", "_t"):
+                state[name] = state[name][:self._size].copy()
+            state["_capacity"] = max(self._size, 1)
+        return state
+
+    def _allocate(self: object, x: np.ndarray, v: np.ndarray,
+                  z: float) -> None:
+        self._x = np.empty((self._capacity,) + np.shape(x))
+        self._v = np.empty((self._capacity,) + np.shape(v))
+        self._z = np.empty((self._capacity,) + np.shape(z))
+        self._t = np.empty(self._capacity)
+
+    def _grow(self: object, capacity: int) -> None:
+        # Geometric growth keeps appends amortized O(1) while the views
+        # handed out by x/v/z/t stay plain contiguous slices.
+        for name in ("_x", "_v", "_z", "_t"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:])
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        self._capacity = capacity
+
+
+class SparseTrajectory:
+    """Trajectory of a population whose mutants come and go.
+
+    Every sample only holds the mutants alive at that time, tagged with
+    their ids, in flat buffers indexed by per-sample offsets: a mutant only
+    costs memory over its lifetime and appending a sample only costs the
+    live mutants. :meth:`lifetime` extracts one mutant; the x/v properties
+    build dense ``(samples, mutants)`` arrays, NaN outside each lifetime,
+    which only suits small populations.
+    """
+
+    def __init__(self: object, capacity: int = 1024) -> None:
+        self._capacity = max(int(capacity), 1)
+        self._size = 0
+        self._t = np.empty(self._capacity)
+        self._z = np.empty(self._capacity)
+        self._offsets = np.zeros(self._capacity + 1, dtype=np.int64)
+        self._ids = np.empty(self._capacity, dtype=np.int64)
+        self._xs = np.empty(self._capacity)
+        self._vs = np.empty(self._capacity)
+        self._lower = self._upper = None
+        self._seen = 0
+
+    def __len__(self: object) -> int:
+        return self._size
+
+    @property
+    def t(self: object) -> np.ndarray:
+        return self._t[:self._size]
+
+    @property
+    def z(self: object) -> np.ndarray:
+        return self._z[:self._size]
+
+    @property
+    def x(self: object) -> np.ndarray:
+        return self._dense(self._xs)
+
+    @property
+    def v(self: object) -> np.ndarray:
+        return self._dense(self._vs)
+
+    @property
+    def mutants(self: object) -> int:
+        """Number of mutant ids seen so far (highest id plus one)."""
+        return self._seen
+
+    @property
+    def ids(self: object) -> np.ndarray:
+        """Ids of the mutants in the last sample."""
+        return self.sample(self._size - 1)[0]
+
+    @property
+    def last(self: object) -> tuple[np.ndarray, np.ndarray, float, float]:
+        i = self._size - 1
+        _, x, v = self.sample(i)
+        return x, v, self._z[i], self._t[i]
+
+    @property
+    def bounds(self: object) -> tuple[tuple, tuple]:
+        """Running ``(lower, upper)`` bounds, each an ``(x, v, z, t)``
+        tuple with x and v indexed by mutant id. NaNs are ignored."""
+        return tuple((x[:self._seen], v[:self._seen], z, t)
+                     for x, v, z, t in (self._lower, self._upper))
+
+    def sample(self: object, i: int) -> tuple[np.ndarray, np.ndarray,
+                                              np.ndarray]:
+        """``(ids, x, v)`` of the mutants alive in sample *i*."""
+        start, stop = self._offsets[i], self._offsets[i + 1]
+        return (self._ids[start:stop], self._xs[start:stop],
+                self._vs[start:stop])
+
+    def lifetime(self: object, mutant: int) -> tuple[np.ndarray, np.ndarray,
+                                                     np.ndarray]:
+        """``(t, x, v)`` of *mutant* over the samples it was alive in."""
+        end = self._offsets[self._size]
+        entries = np.flatnonzero(self._ids[:end] == mutant)
+        rows = np.searchsorted(self._offsets[:self._size + 1], entries,
+                               side="right") - 1
+        return self._t[rows], self._xs[entries], self._vs[entries]
+
+    def append(self: object, x: np.ndarray, v: np.ndarray, z: float,
+               t: float, ids: np.ndarray = None) -> None:
+        """Store a sample of the mutants *ids* (0, 1, ... by default)."""
+        ids = np.arange(len(x)) if ids is None else ids
+        start = self._offsets[self._size]
+        stop = start + len(ids)
+        if self._size == self._capacity:
+            self._grow_samples(2 * self._capacity)
+        if stop > len(self._ids):
+            self._grow_entries(max(2 * len(self._ids), stop))
+        self._ids[start:stop] = ids
+        self._xs[start:stop] = x
+        self._vs[start:stop] = v
+        self._z[self._size] = z
+        self._t[self._size] = t
+        self._size += 1
+        self._offsets[self._size] = stop
+        self._track(ids, x, v, z, t)
+
+    def reset(self: object) -> None:
+        self._size = 1
+        self._lower = None
+        ids, x, v = self.sample(0)
+        self._track(ids, x, v, self._z[0], self._t[0])
+
+    def _track(self: object, ids: np.ndarray, x: np.ndarray, v: np.ndarray,
+               z: float, t: float) -> None:
+        # Per-id bounds start out NaN, which fmin/fmax skip
+        if self._lower is None:
+            self._seen = 0
+            self._lower = (np.empty(0), np.empty(0), np.array(z, dtype=float),
+                           np.array(t, dtype=float))
+            self._upper = tuple(np.array(a) for a in self._lower)
+        if len(ids) and ids.max() >= self._seen:
+            self._seen = int(ids.max()) + 1
+            size = len(self._lower[0])
+            if self._seen > size:
+                size = max(2 * size, self._seen)
+                self._lower = self._padded(self._lower, size)
+                self._upper = self._padded(self._upper, size)
+        for lower, upper, a in zip(self._lower[:2], self._upper[:2], (x, v)):
+            lower[ids] = np.fmin(lower[ids], a)
+            upper[ids] = np.fmax(upper[ids], a)
+        for lower, upper, a in zip(self._lower[2:], self._upper[2:], (z, t)):
+            np.fmin(lower, a, out=lower)
+            np.fmax(upper, a, out=upper)
+
+    @staticmethod
+    def _padded(bounds: tuple, size: int) -> tuple:
+        x, v, z, t = bounds
+        return (np.concatenate((x, np.full(size - len(x), np.nan))),
+                np.concatenate((v, np.full(size - len(v), np.nan))), z, t)
+
+    def _dense(self: object, values: np.ndarray) -> np.ndarray:
+        end = self._offsets[self._size]
+        rows = np.repeat(np.arange(self._size),
+                         np.diff(self._offsets[:self._size + 1]))
+        dense = np.full((self._size, self.mutants), np.nan)
+        dense[rows, self._ids[:end]] = values[:end]
+        return dense
+
+    def _grow_samples(self: object, capacity: int) -> None:
+        for name in ("_t", "_z"):
+            old = getattr(self, name)
+            new = np.empty(capacity)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        offsets = np.zeros(capacity + 1, dtype=np.int64)
+        offsets[:self._size + 1] = self._offsets[:self._size + 1]
+        self._offsets = offsets
+        self._capacity = capacity
+
+    def _grow_entries(self: object, capacity: int) -> None:
+        end = self._offsets[self._size]
+        for name in ("_ids", "_xs", "_vs"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:end] = old[:end]
+            setattr(self, name, new)
+
+    def __getstate__(self: object) -> dict:
+        # Only the filled part of the buffers is worth saving
+        state = self.__dict__.copy()
+        end = self._offsets[self._size]
+        for name in ("_t", "_z"):
+            state[name] = state[name][:max(self._size, 1)].copy()
+        state["_offsets"] = self._offsets[:max(self._size, 1) + 1].copy()
+        for name in ("_ids", "_xs", "_vs"):
+            state[name] = state[name][:max(end, 1)].copy()
+        state["_capacity"] = max(self._size, 1)
+        return state
+
+
+# Fixed size .npy header, so the shape can be rewritten in place as the
+# file grows without moving the data behind it.
+_MAGIC = b"\x93NUMPY\x01\x00"
+_HEADER = 128
+
+
+def _write_header(f, shape: tuple[int, ...]) -> None:
+    header = repr({"descr": "<f8", "fortran_order": False, "shape": shape})
+    size = _HEADER - len(_MAGIC) - 2
+    f.seek(0)
+    f.write(_MAGIC + struct.pack("<H", size) +
+            header.ljust(size - 1).encode("latin1") + b"\n")
+
+
+class NpyTrajectory(Trajectory):
+    """Trajectory that streams its samples to ``x.npy``, ``v.npy``,
+    ``z.npy`` and ``t.npy`` inside *path*.
+
+    Only every *every*-th appended sample is kept (the newest one is always
+    available through :attr:`last`), and at most *chunk* samples are held
+    in memory before being written out sequentially. The x/v/z/t
+    properties return read-only memory maps, so readers page data in
+    lazily; :func:`load` opens a finished run the same way.
+    """
+
+    NAMES = ("x", "v", "z", "t")
+
+    def __init__(self: object, path: str, every: int = 1,
+                 chunk: int = 4096) -> None:
+        super(NpyTrajectory, self).__init__(capacity=chunk)
+        self._path = path
+        self._every = every
+        self._appended = 0
+        self._written = 0
+        self._last = None
+        self._files = {}
+        self._maps = {}
+        os.makedirs(path, exist_ok=True)
+
+    def __len__(self: object) -> int:
+        return self._written + self._size
+
+    def _map(self: object, name: str) -> np.ndarray:
+        self.flush()
+        cached = self._maps.get(name)
+        if cached is None or len(cached) != self._written:
+            cached = np.load(os.path.join(self._path, name + ".npy"),
+                             mmap_mode="r")
+            self._maps[name] = cached
+        return cached
+
+    @property
+    def x(self: object) -> np.ndarray:
+        return self._map("x")
+
+    @property
+    def v(self: object) -> np.ndarray:
+        return self._map("v")
+
+    @property
+    def z(self: object) -> np.ndarray:
+        return self._map("z")
+
+    @property
+    def t(self: object) -> np.ndarray:
+        return self._map("t")
+
+    @property
+    def last(self: object) -> tuple[np.ndarray, np.ndarray, float, float]:
+        return self._last
+
+    def append(self: object, x: np.ndarray, v: np.ndarray,
+               z: float, t: float) -> None:
+        self._last = (np.array(x, dtype=float), np.array(v, dtype=float),
+                      np.array(z, dtype=float), float(t))
+        self._track(*self._last)
+        if self._appended % self._every == 0:
+            if self._x is None:
+                self._allocate(x, v, z)
+                self._open()
+            elif self._size == self._capacity:
+                self.flush()
+            i = self._size
+            self._x[i], self._v[i], self._z[i], self._t[i] = self._last
+            self._size += 1
+        self._appended += 1
+
+    def flush(self: object) -> None:
+        if self._size == 0:
+            return
+        for name in self.NAMES:
+            f, buffer = self._file(name), getattr(self, "_" + name)
+            # Past the rows in the header, which may be short of the end
+            # of the file after a reset or restore
+            f.seek(_HEADER + self._written * buffer[0].nbytes)
+            f.write(np.ascontiguousarray(buffer[:self._size]).tobytes())
+            _write_header(f, (self._written + self._size,) +
+                          buffer.shape[1:])
+            f.flush()
+        self._written += self._size
+        self._size = 0
+
+    def close(self: object) -> None:
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def reset(self: object) -> None:
+        # Keep only the first stored sample, which is the initial state
+        self.flush()
+        first = tuple(np.array(self._map(n)[0]) for n in self.NAMES)
+        self._maps = {}
+        self._rewind(1)
+        self._appended = 1
+        self._last = (first[0], first[1], first[2], float(first[3]))
+        self._lower = None
+        self._track(*self._last)
+
+    def __getstate__(self: object) -> dict:
+        # The files are the trajectory; only the cursor into them is saved
+        self.flush()
+        state = self.__dict__.copy()
+        state["_files"], state["_maps"] = {}, {}
+        state["_x"] = state["_v"] = state["_z"] = state["_t"] = None
+        return state
+
+    def __setstate__(self: object, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._last is None:
+            return
+        # Samples written after the snapshot are dropped, so resuming
+        # appends exactly where the snapshot left off
+        self._allocate(*self._last[:3])
+        self._rewind(self._written)
+
+    def _rewind(self: object, rows: int) -> None:
+        # Only the row count in the headers shrinks; the files keep their
+        # size, because memory maps of them may still be open and reading
+        # past the end of a truncated file kills the process. The stale
+        # rows are overwritten by the next flushes.
+        for name in self.NAMES:
+            f = self._file(name)
+            _write_header(f, (rows,) + getattr(self, "_" + name).shape[1:])
+            f.flush()
+        self._written = rows
+
+    def _file(self: object, name: str):
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self._path, name + ".npy"),
+                                     "r+b")
+        return self._files[name]
+
+    def _open(self: object) -> None:
+        for name in self.NAMES:
+            f = open(os.path.join(self._path, name + ".npy"), "w+b")
+            _write_header(f, (0,) + getattr(self, "_" + name).shape[1:])
+            self._files[name] = f
+
+
+def load(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Memory map the ``(t, x, v, z)`` arrays written by a
+    :class:`NpyTrajectory`."""
+    return tuple(np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+                 for name in ("t", "x", "v", "z"))
@@ -1,18 +1,48 @@
 import simcx
+import numpy as np
 
+from matplotlib.transforms import nonsingular
+
+from .lod import MinMaxPyramid, stride
 from .models import GenericVirusModel
 from .simulators import VirusIterator
 
 from mpl_toolkits.mplot3d import Axes3D
 
 
+def _padded(lo: float, hi: float, margin: float = 0.05) -> tuple:
+    # The same margins autoscale_view() would add around the data
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return None
+    lo, hi = nonsingular(float(lo), float(hi))
+    pad = margin * (hi - lo)
+    return lo - pad, hi + pad
+
+
+def _set_limits(ax, limits: list, i: int, *lims: tuple) -> None:
+    # Only touch the axes when the bounds actually moved
+    if tuple(lims) == limits[i] or None in lims:
+        return
+    limits[i] = tuple(lims)
+    setters = (ax.set_xlim, ax.set_ylim, getattr(ax, "set_zlim", None))
+    for setter, lim in zip(setters, lims):
+        setter(*lim)
+
+
 class VirusVisual(simcx.MplVisual):
     def __init__(self: object,
-                 sim: GenericVirusModel, title: str = None) -> None:
+                 sim: GenericVirusModel, title: str = None,
+                 max_points: int = 2000) -> None:
         super(VirusVisual, self).__init__(sim, width=1000, height=800)
 
         self.x, self.v = [], []
+        self._lod_x = [MinMaxPyramid(max_points)
+                       for _ in range(self.sim._mutants)]
+        self._lod_v = [MinMaxPyramid(max_points)
+                       for _ in range(self.sim._mutants)]
+        self._lod_z = MinMaxPyramid(max_points)
         self.plots = self.sim._mutants + 1
+        self._limits = [None] * self.plots
         self.ax = [
             self.figure.add_subplot(self.plots, 1, i + 1)
             for i in range(self.plots)]
@@ -36,22 +66,33 @@ class VirusVisual(simcx.MplVisual):
                                    "-", label="Global immune system response")
         self.ax[-1].legend()
 
+    def _lod(self: object, lod: MinMaxPyramid, t, y) -> tuple:
+        lod.update(t, y)
+        return lod.points(t, y)
+
     def draw(self: object) -> None:
+        t = self.sim._t
+        (x0, v0, z0, t0), (x1, v1, z1, t1) = self.sim._bounds
+        tlim = _padded(t0, t1)
         for i in range(self.sim._mutants):
-            self.x[i].set_data(self.sim._t, self.sim._x[:, i])
-            self.v[i].set_data(self.sim._t, self.sim._v[:, i])
-            self.ax[i].relim()
-            self.ax[i].autoscale_view()
-        self.z.set_data(self.sim._t, self.sim._z)
-        self.ax[-1].relim()
-        self.ax[-1].autoscale_view()
+            self.x[i].set_data(
+                *self._lod(self._lod_x[i], t, self.sim._x[:, i]))
+            self.v[i].set_data(
+                *self._lod(self._lod_v[i], t, self.sim._v[:, i]))
+            _set_limits(self.ax[i], self._limits, i, tlim,
+                        _padded(np.fmin(x0[i], v0[i]),
+                                np.fmax(x1[i], v1[i])))
+        self.z.set_data(*self._lod(self._lod_z, t, self.sim._z))
+        _set_limits(self.ax[-1], self._limits, -1, tlim, _padded(z0, z1))
 
 
 class VirusPhaseSpace(simcx.MplVisual):
-    def __init__(self: object, sim: VirusIterator, title=None, **kwargs):
+    def __init__(self: object, sim: VirusIterator, title=None,
+                 max_points: int = 5000, **kwargs):
         super(VirusPhaseSpace, self).__init__(
             sim, width=1000, height=800, **kwargs)
 
+        self._max_points = max_points
         self.ax = [self.figure.add_subplot(self.sim._mutants, 1, i + 1,
                                            projection="3d")
                    for i in range(self.sim._mutants)]
@@ -60,18 +101,21 @@ class VirusPhaseSpace(simcx.MplVisual):
             size=18)
 
         self.lines = []
+        self._limits = [None] * self.sim._mutants
         for i in range(self.sim._mutants):
             self.ax[i].set_title("Virus Phase Space")
             line, = self.ax[i].plot(
                 self.sim._x[:, i], self.sim._v[:, i], self.sim._z)
             self.lines.append(line)
-            self.ax[i].set_xlim(-20, 20)
-            self.ax[i].set_ylim(-20, 20)
-            self.ax[i].set_zlim(-20, 20)
 
     def draw(self: object) -> None:
+        # Orbits have no natural ordering to take extremes over, so they are
+        # thinned with a stable power of two stride instead
+        s = stride(len(self.sim._t), self._max_points)
+        (x0, v0, z0, _), (x1, v1, z1, _) = self.sim._bounds
         for i in range(self.sim._mutants):
             self.lines[i].set_data_3d(
-                self.sim._x[:, i], self.sim._v[:, i], self.sim._z)
-            self.ax[i].relim()
-            self.ax[i].autoscale_view()
+                self.sim._x[::s, i], self.sim._v[::s, i], self.sim._z[::s])
+            _set_limits(self.ax[i], self._limits, i,
+                        _padded(x0[i], x1[i]), _padded(v0[i], v1[i]),
+                        _padded(z0, z1))
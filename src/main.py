@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import simcx
+import simcx.headless
 import matplotlib.pyplot as plt
 
 from hiv.models import HIVModel, GenericVirusModel
@@ -25,13 +26,20 @@ class VirusIntegrator:
         simcx.run()
 
 
-def orbit(model, *args):
+def orbit(model, *args, frames=None):
+    # With frames the orbit is computed headless instead of in a window
     sim = VirusIterator(model, *args)
     vis = VirusPhaseSpace(sim)
-    display = simcx.Display()
+    if frames is None:
+        display = simcx.Display()
+    else:
+        display = simcx.headless.HeadlessDisplay()
     display.add_simulator(sim)
     display.add_visual(vis)
-    simcx.run()
+    if frames is None:
+        simcx.run()
+    else:
+        display.run(frames)
 
 
 # Integration Methods
@@ -84,5 +92,5 @@ if __name__ == "__main__":
                     q=0.01)
 
     # integration(test, x, v, z)
-    orbit(test, x, v, z)
+    orbit(test, x, v, z, frames=2000)
     plt.savefig("hiv.pdf")
@@ -18,36 +18,31 @@
 """
 A simulation framework for complex systems modelling and analysis.
 
+The numeric core (:class:`Simulator`) has no GUI dependencies. The plotting
+and window classes (:class:`MplVisual`, :class:`Display`, ...) pull in
+matplotlib and pyglet, so they are only imported the first time they are
+used; batch jobs and worker processes that just step simulators start fast
+and run without a display.
+
 """
 
 from __future__ import division
+import importlib
 import os
-import pyglet
-from matplotlib import animation
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-import matplotlib.pyplot as plt
+import pickle
 
 from .__version__ import __version__
 
-import matplotlib as mpl
-mpl.use('Agg')
-# Better Graphics
-mpl.style.use("ggplot")
-
-
-try:
-    from io import BytesIO as StringIO
-except ImportError:
-    from cStringIO import StringIO
-
 __docformat__ = 'restructuredtext'
 __author__ = 'Tiago Baptista'
 
-# Variable to determine if we are being imported by readthedocs autobuild
-on_rtd = os.environ.get('READTHEDOCS') == 'True'
-
 
 class Simulator(object):
+    """Base class of all simulators. :attr:`dirty` marks a state change
+    and is what makes a :class:`Display` re-render the visuals showing
+    them. The Display sets it after every :meth:`step` it makes; state
+    changed outside of it (e.g. :meth:`reset`) has to set it too."""
+
     def __init__(self):
         self.dirty = True
 
@@ -57,17 +52,48 @@ class Simulator(object):
     def reset(self):
         assert False, "Not implemented!"
 
+    def run(self, n_steps, delta=0):
+        """Advance the simulation *n_steps* times without a :class:`Display`.
+        Subclasses that keep a history may override this to return it;
+        options they add are keyword-only, so *delta* keeps its place."""
+        for _ in range(n_steps):
+            self.step(delta)
+        self.dirty = True
 
-class PyafaiSimulator(Simulator):
-    def __init__(self, world):
-        super(PyafaiSimulator, self).__init__()
+    def run_until(self, t_end, delta=0):
+        assert False, "Not implemented!"
 
-        self.world = world
-        self.world.paused = False
-        pyglet.clock.unschedule(self.world._start_schedule)
+    def counters(self):
+        """Work counters (e.g. function evaluations) reported next to the
+        :class:`Display` timings."""
+        return {}
+
+    def checkpoint(self, path):
+        """Write a snapshot of the simulator to *path*, from which
+        :meth:`restore` resumes it exactly. The snapshot is written to a
+        temporary file first and then moved into place, so a crash leaves
+        either the previous or the new snapshot, never a partial one; the
+        temporary file is removed again when pickling fails. Subclasses
+        control what goes in through the pickle protocol."""
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
 
-    def step(self, delta=0):
-        self.world.update(delta)
+    @staticmethod
+    def restore(path):
+        """The simulator saved by :meth:`checkpoint` in *path*."""
+        with open(path, 'rb') as f:
+            sim = pickle.load(f)
+        sim.dirty = True
+        return sim
 
 
 class Visual(object):
@@ -80,258 +106,26 @@ class Visual(object):
         assert False, "Not implemented!"
 
 
-class MplVisual(Visual):
-    def __init__(self, sim: Simulator, **kwargs):
-        super(MplVisual, self).__init__(sim, width=kwargs.get('width', 500),
-                                        height=kwargs.get('height', 500))
-
-        self.dpi = 80
-        self.figure = plt.figure(figsize=(self.width/self.dpi,
-                                          self.height/self.dpi),
-                                 dpi=self.dpi)
-        self._create_canvas()
-
-    def _create_canvas(self):
-        self.canvas = FigureCanvas(self.figure)
-        data = StringIO()
-        self.canvas.print_raw(data, dpi=self.dpi)
-        self.image = pyglet.image.ImageData(self.width, self.height,
-                                            'RGBA', data.getvalue(),
-                                            -4 * self.width)
-
-    def update_image(self):
-        data = StringIO()
-        self.canvas.print_raw(data, dpi=self.dpi)
-        self.image.set_data('RGBA', -4 * self.width, data.getvalue())
-
-
-class PyafaiVisual(Visual):
-    def __init__(self, sim: PyafaiSimulator, width=500, height=500):
-        self.world = sim.world
-
-        if hasattr(self.world, 'width'):
-            width = self.world.width
-
-        if hasattr(self.world, 'height'):
-            height = self.world.height
-
-        super(PyafaiVisual, self).__init__(sim, width=width, height=height)
-
-    def draw(self):
-        self.world.draw()
-        self.world.draw_objects()
-
-
-# Prevent readthedocs from using pyglet.window as GLU is not installed there.
-if on_rtd:
-    pyglet_window = object
-else:
-    pyglet_window = pyglet.window.Window
-
-
-class Display(pyglet_window):
-    def __init__(self, width=500, height=500, interval=0.05,
-                 multi_sampling=True, **kwargs):
-
-        if 'caption' not in kwargs:
-            kwargs['caption'] = 'Complex Systems (paused)'
-        else:
-            kwargs['caption'] += ' (paused)'
-
-        if multi_sampling:
-            # Enable multi sampling if available on the hardware
-            display = pyglet.canvas.Display()
-            screen = display.get_default_screen()
-            template = pyglet.gl.Config(sample_buffers=1, samples=4,
-                                        double_buffer=True)
-            try:
-                config = screen.get_best_config(template)
-            except pyglet.window.NoSuchConfigException:
-                template = pyglet.gl.Config()
-                config = screen.get_best_config(template)
-
-            super(Display, self).__init__(width, height,
-                                          config=config, **kwargs)
-        else:
-            super(Display, self).__init__(width, height,
-                                          **kwargs)
-
-        self.paused = True
-        self.show_fps = False
-        self.real_time = False
-        self._recording = False
-        self._movie_writer = None
-        self._interval = interval
-        self._sims = []
-        self._visuals = []
-        self._pos = []
-
-        self._fps_display = pyglet.clock.get_fps()
-
-        pyglet.clock.schedule_interval(self._update, self._interval)
-
-    def add_simulator(self, sim: Simulator):
-        if sim not in self._sims:
-            self._sims.append(sim)
-
-    def add_visual(self, visual: Visual, x=0, y=0):
-        if visual not in self._visuals:
-            self._visuals.append(visual)
-            self._pos.append((x, y))
-            self._resize_window()
-
-            if isinstance(visual, MplVisual):
-                visual.update_image()
-
-    def start_recording(self, filename='simcx.mp4', fps=None, bitrate=1800):
-        if self._movie_writer is None:
-            if fps is None:
-                fps = 1 // self._interval
-
-            self._movie_writer = FFMpegWriter(fps=fps, bitrate=bitrate)
-            self._movie_writer.setup(self, filename)
-            self._recording = True
-            print("Recording started...")
-        else:
-            print("A movie is already being recorded for this Display.")
-
-    def on_draw(self):
-        # clear window
-        self.clear()
-
-        # draw visuals
-        for i in range(len(self._visuals)):
-            vis = self._visuals[i]
-            if isinstance(vis, MplVisual):
-                vis.image.blit(*self._pos[i])
-            else:
-                pyglet.gl.glPushMatrix()
-                pyglet.gl.glTranslatef(self._pos[i][0], self._pos[i][1], 0)
-                vis.draw()
-                pyglet.gl.glPopMatrix()
-
-        # show fps
-        if self.show_fps:
-            self._fps_display.draw()
-
-    def on_close(self):
-        if self._movie_writer is not None:
-            self._movie_writer.finish()
-
-        super(Display, self).on_close()
-
-    def on_key_press(self, symbol, modifiers):
-        super(Display, self).on_key_press(symbol, modifiers)
-
-        if symbol == pyglet.window.key.S:
-            if self.paused:
-                self._step_simulation(self._interval)
-
-        elif symbol == pyglet.window.key.R:
-            if pyglet.window.key.MOD_ALT & modifiers:
-                self.start_recording()
-            elif modifiers == 0:
-                if self.paused:
-                    self._reset_simulation()
-
-        elif symbol == pyglet.window.key.SPACE:
-            if self.paused:
-                self.paused = False
-                self.set_caption(self.caption.replace(" (paused)", ""))
-            else:
-                self.paused = True
-                self.set_caption(self.caption + " (paused)")
-        elif symbol == pyglet.window.key.F:
-            self.show_fps = not self.show_fps
-
-    def _draw_gui(self):
-        pass
-
-    def _update(self, dt):
-        if not self.paused:
-            self._step_simulation(dt)
-
-    def _step_simulation(self, dt=None):
-        if self._recording:
-            self._movie_writer.grab_frame()
-
-        if not self.real_time:
-            dt = self._interval
-
-        for sim in self._sims:
-            sim.step(dt)
-
-        for vis in self._visuals:
-            if isinstance(vis, MplVisual):
-                vis.draw()
-                vis.update_image()
-
-    def _reset_simulation(self):
-        for sim in self._sims:
-            sim.reset()
-
-        for vis in self._visuals:
-            if isinstance(vis, MplVisual):
-                vis.draw()
-                vis.update_image()
-
-    def _resize_window(self):
-        max_x = 0
-        max_y = 0
-        for i in range(len(self._visuals)):
-            if self._pos[i][0] + self._visuals[i].width > max_x:
-                max_x = self._pos[i][0] + self._visuals[i].width
-            if self._pos[i][1] + self._visuals[i].height > max_y:
-                max_y = self._pos[i][1] + self._visuals[i].height
-
-        if max_x != self.width or max_y != self.height:
-            self.set_size(max_x, max_y)
-            self.clear()
-
-
-class FFMpegWriter(animation.FFMpegWriter):
-    @property
-    def frame_size(self):
-        """A tuple (width,height) in pixels of a movie frame."""
-
-        return self.display.width, self.display.height
-
-    def setup(self, display, outfile):
-        """
-        Perform setup for writing the movie file.
-        display: `simcx.Display` instance
-        The Display instance whose framebuffer we want to use.
-        outfile: string
-        The filename of the resulting movie file
-        """
-
-        self.outfile = outfile
-        self.display = display
-
-        # Run here so that grab_frame() can write the data to a pipe. This
-        # eliminates the need for temp files.
-        self._run()
-
-    def grab_frame(self, **savefig_kwargs):
-        """
-        Grab the image information from the display and save as a movie frame.
-        The keyword arguments are not being used in the subclass.
-        """
-
-        try:
-            image = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
-            self._frame_sink().write(image.get_data('RGBA',
-                                                    -4 * self.display.width))
-
-        except RuntimeError:
-            out, err = self._proc.communicate()
-            print('MovieWriter -- Error ')
-            print('running proc:\n%s\n%s' % (out, err))
-            raise
+# Attributes provided by the GUI and plotting sub-modules, imported on first
+# access
+_LAZY = {'MplVisual': 'mpl',
+         'PyafaiSimulator': 'display',
+         'PyafaiVisual': 'display',
+         'Display': 'display',
+         'FFMpegWriter': 'display',
+         'run': 'display',
+         'on_rtd': 'display',
+         'pyglet_window': 'display'}
 
 
-def run():
-    pyglet.app.run()
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module('.' + _LAZY[name], __name__),
+                        name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
-# import sub-modules
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015-2018 Tiago Baptista
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+"""
+The pyglet window that steps simulators and shows their visuals.
+
+"""
+
+from __future__ import division
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pyglet
+from matplotlib import animation
+from . import Simulator, Visual
+from .mpl import MplVisual
+from .stats import Stats
+
+__docformat__ = 'restructuredtext'
+__author__ = 'Tiago Baptista'
+
+# Variable to determine if we are being imported by readthedocs autobuild
+on_rtd = os.environ.get('READTHEDOCS') == 'True'
+
+
+class PyafaiSimulator(Simulator):
+    def __init__(self, world):
+        super(PyafaiSimulator, self).__init__()
+
+        self.world = world
+        self.world.paused = False
+        pyglet.clock.unschedule(self.world._start_schedule)
+
+    def step(self, delta=0):
+        self.world.update(delta)
+        self.dirty = True
+
+
+class PyafaiVisual(Visual):
+    def __init__(self, sim: PyafaiSimulator, width=500, height=500):
+        self.world = sim.world
+
+        if hasattr(self.world, 'width'):
+            width = self.world.width
+
+        if hasattr(self.world, 'height'):
+            height = self.world.height
+
+        super(PyafaiVisual, self).__init__(sim, width=width, height=height)
+
+    def draw(self):
+        self.world.draw()
+        self.world.draw_objects()
+
+
+# Prevent readthedocs from using pyglet.window as GLU is not installed there.
+if on_rtd:
+    pyglet_window = object
+else:
+    pyglet_window = pyglet.window.Window
+
+
+class Display(pyglet_window):
+    def __init__(self, width=500, height=500, interval=0.05,
+                 multi_sampling=True, max_fps=None, steps_per_frame=1,
+                 background=False, workers=None, profile=False,
+                 stats_file=None, **kwargs):
+
+        if 'caption' not in kwargs:
+            kwargs['caption'] = 'Complex Systems (paused)'
+        else:
+            kwargs['caption'] += ' (paused)'
+
+        if multi_sampling:
+            # Enable multi sampling if available on the hardware
+            display = pyglet.canvas.Display()
+            screen = display.get_default_screen()
+            template = pyglet.gl.Config(sample_buffers=1, samples=4,
+                                        double_buffer=True)
+            try:
+                config = screen.get_best_config(template)
+            except pyglet.window.NoSuchConfigException:
+                template = pyglet.gl.Config()
+                config = screen.get_best_config(template)
+
+            super(Display, self).__init__(width, height,
+                                          config=config, **kwargs)
+        else:
+            super(Display, self).__init__(width, height,
+                                          **kwargs)
+
+        self.paused = True
+        self.show_fps = False
+        self.real_time = False
+        self._recording = False
+        self._movie_writer = None
+        self._interval = interval
+        self._max_fps = max_fps
+        self._last_render = None
+        self._steps_per_frame = steps_per_frame
+        # Held while simulators step and while visuals read them, so the
+        # render loop always sees a consistent snapshot
+        self._lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+        # Simulators are independent of each other, so with several workers
+        # they are stepped concurrently (NumPy releases the GIL)
+        self._pool = None if workers is None or workers < 2 \
+            else ThreadPoolExecutor(max_workers=workers)
+        self._sims = []
+        self._visuals = []
+        self._pos = []
+
+        self._fps_display = pyglet.window.FPSDisplay(self)
+        self.stats = Stats(enabled=profile)
+        self._stats_file = stats_file
+        self._stats_label = None
+        self._stats_shown = None
+
+        pyglet.clock.schedule_interval(self._update, self._interval)
+
+        if background:
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+
+    def add_simulator(self, sim: Simulator):
+        if sim not in self._sims:
+            self._sims.append(sim)
+
+    def add_visual(self, visual: Visual, x=0, y=0):
+        if visual not in self._visuals:
+            self._visuals.append(visual)
+            self._pos.append((x, y))
+            self._resize_window()
+
+            if isinstance(visual, MplVisual):
+                visual.update_image()
+
+    def start_recording(self, filename='simcx.mp4', fps=None, bitrate=1800):
+        if self._movie_writer is None:
+            if fps is None:
+                fps = 1 // self._interval
+
+            self._movie_writer = FFMpegWriter(fps=fps, bitrate=bitrate)
+            self._movie_writer.setup(self, filename)
+            self._recording = True
+            print("Recording started...")
+        else:
+            print("A movie is already being recorded for this Display.")
+
+    def on_draw(self):
+        # clear window
+        self.clear()
+
+        # draw visuals
+        with self.stats.time('blit'):
+            for i in range(len(self._visuals)):
+                vis = self._visuals[i]
+                if isinstance(vis, MplVisual):
+                    vis.image.blit(*self._pos[i])
+                else:
+                    pyglet.gl.glPushMatrix()
+                    pyglet.gl.glTranslatef(self._pos[i][0], self._pos[i][1],
+                                           0)
+                    vis.draw()
+                    pyglet.gl.glPopMatrix()
+
+        # show fps
+        if self.show_fps:
+            self._fps_display.draw()
+            if self.stats.enabled:
+                self._draw_stats()
+
+    def on_close(self):
+        self._closed = True
+        if self._worker is not None:
+            self._worker.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+        if self._movie_writer is not None:
+            self._movie_writer.finish()
+
+        if self._stats_file is not None and self.stats.enabled:
+            self.stats.save(self._stats_file, self._counters())
+
+        super(Display, self).on_close()
+
+    def on_key_press(self, symbol, modifiers):
+        super(Display, self).on_key_press(symbol, modifiers)
+
+        if symbol == pyglet.window.key.S:
+            if self.paused:
+                self._step_simulation(self._interval)
+
+        elif symbol == pyglet.window.key.R:
+            if pyglet.window.key.MOD_ALT & modifiers:
+                self.start_recording()
+            elif modifiers == 0:
+                if self.paused:
+                    self._reset_simulation()
+
+        elif symbol == pyglet.window.key.SPACE:
+            if self.paused:
+                self.paused = False
+                self.set_caption(self.caption.replace(" (paused)", ""))
+            else:
+                self.paused = True
+                self.set_caption(self.caption + " (paused)")
+        elif symbol == pyglet.window.key.F:
+            self.show_fps = not self.show_fps
+
+    def _draw_gui(self):
+        pass
+
+    def _counters(self):
+        counters = {}
+        for i, sim in enumerate(self._sims):
+            for name, value in sim.counters().items():
+                counters['%s[%d].%s' % (type(sim).__name__, i, name)] = value
+        return counters
+
+    def _draw_stats(self):
+        # The text is only rebuilt twice a second, laying it out is slow
+        now = time.monotonic()
+        if self._stats_label is None:
+            self._stats_label = pyglet.text.Label(
+                '', font_name='monospace', font_size=10, x=10,
+                y=self.height - 10, anchor_y='top', multiline=True,
+                width=self.width - 20, color=(0, 0, 0, 255))
+        if self._stats_shown is None or now - self._stats_shown > 0.5:
+            counters = {name.split('.')[-1] if len(self._sims) == 1
+                        else name: value
+                        for name, value in self._counters().items()}
+            self._stats_label.text = '\n'.join(self.stats.lines(counters))
+            self._stats_label.y = self.height - 10
+            self._stats_shown = now
+        self._stats_label.draw()
+
+    def _update(self, dt):
+        if self._worker is not None:
+            # The worker does the stepping, this only shows its progress
+            if self._recording and not self.paused:
+                self._movie_writer.grab_frame()
+            self._render()
+        elif not self.paused:
+            self._step_simulation(dt)
+        else:
+            # Visuals skipped by the frame rate limit catch up while paused
+            self._render()
+
+    def _work(self):
+        """Background stepping loop, used when the Display is created with
+        ``background=True``. Simulators advance as fast as they can, in
+        batches of *steps_per_frame* steps, independently of rendering."""
+        while not self._closed:
+            if self.paused:
+                time.sleep(self._interval)
+                continue
+            self._advance(self._interval)
+
+    def _advance(self, dt):
+        with self._lock:
+            if self._pool is None or len(self._sims) < 2:
+                for _ in range(self._steps_per_frame):
+                    for sim in self._sims:
+                        with self.stats.time('step'):
+                            sim.step(dt)
+                        sim.dirty = True
+            else:
+                # Joined before returning, so rendering never sees a
+                # simulator mid step
+                for _ in self._pool.map(self._advance_one, self._sims,
+                                        [dt] * len(self._sims)):
+                    pass
+
+    def _advance_one(self, sim, dt):
+        for _ in range(self._steps_per_frame):
+            with self.stats.time('step'):
+                sim.step(dt)
+            sim.dirty = True
+
+    def _step_simulation(self, dt=None):
+        if self._recording:
+            self._movie_writer.grab_frame()
+
+        if not self.real_time:
+            dt = self._interval
+
+        self._advance(dt)
+        self._render()
+
+    def _reset_simulation(self):
+        with self._lock:
+            for sim in self._sims:
+                sim.reset()
+
+        self._render(force=True)
+
+    def _render(self, force=False):
+        """Re-rasterise the matplotlib visuals whose simulator is dirty, at
+        most *max_fps* times per second. Simulators stay dirty until their
+        visuals are rendered, so skipped frames are picked up later. Only
+        drawing holds the lock, the figures are rasterised from a snapshot
+        of the data while a background worker steps on."""
+        now = time.monotonic()
+        if not force and self._max_fps and self._last_render is not None \
+                and now - self._last_render < 1 / self._max_fps:
+            return
+
+        visuals = [vis for vis in self._visuals
+                   if isinstance(vis, MplVisual) and (force or vis.sim.dirty)]
+        if not visuals:
+            return
+
+        with self._lock:
+            for vis in visuals:
+                with self.stats.time('draw'):
+                    vis.draw()
+                    vis.snapshot()
+            for vis in visuals:
+                vis.sim.dirty = False
+        for vis in visuals:
+            with self.stats.time('update_image'):
+                vis.update_image()
+        self._last_render = now
+
+    def _resize_window(self):
+        max_x = 0
+        max_y = 0
+        for i in range(len(self._visuals)):
+            if self._pos[i][0] + self._visuals[i].width > max_x:
+                max_x = self._pos[i][0] + self._visuals[i].width
+            if self._pos[i][1] + self._visuals[i].height > max_y:
+                max_y = self._pos[i][1] + self._visuals[i].height
+
+        if max_x != self.width or max_y != self.height:
+            self.set_size(max_x, max_y)
+            self.clear()
+
+
+class FFMpegWriter(animation.FFMpegWriter):
+    @property
+    def frame_size(self):
+        """A tuple (width,height) in pixels of a movie frame."""
+
+        return self.display.width, self.display.height
+
+    def setup(self, display, outfile):
+        """
+        Perform setup for writing the movie file.
+        display: `simcx.Display` instance
+        The Display instance whose framebuffer we want to use.
+        outfile: string
+        The filename of the resulting movie file
+        """
+
+        self.outfile = outfile
+        self.display = display
+
+        # Run here so that grab_frame() can write the data to a pipe. This
+        # eliminates the need for temp files.
+        self._run()
+
+    def grab_frame(self, **savefig_kwargs):
+        """
+        Grab the image information from the display and save as a movie frame.
+        The keyword arguments are not being used in the subclass.
+        """
+
+        try:
+            image = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
+            self._frame_sink().write(image.get_data('RGBA',
+                                                    -4 * self.display.width))
+
+        except RuntimeError:
+            out, err = self._proc.communicate()
+            print('MovieWriter -- Error ')
+            print('running proc:\n%s\n%s' % (out, err))
+            raise
+
+
+def run():
+    pyglet.app.run()
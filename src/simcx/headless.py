@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015-2017 Tiago Baptista
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+"""
+This module provides a window-less counterpart of :class:`simcx.Display`.
+Frames are composed straight from the Agg canvases of the
+:class:`simcx.MplVisual` instances, so figures and videos can be produced on
+servers without a display or OpenGL.
+
+"""
+
+from __future__ import division
+import os
+import queue
+import subprocess
+import threading
+import numpy as np
+import matplotlib as mpl
+import matplotlib.image
+from . import MplVisual, Simulator
+
+__docformat__ = 'restructuredtext'
+__author__ = 'Tiago Baptista'
+
+
+class FrameWriter(object):
+    """Base class of the frame sinks used by :class:`HeadlessDisplay`.
+
+    Frames are handed to a writer thread through a queue of at most
+    *max_queue* frames, so encoding overlaps with simulation and rendering
+    while memory use stays bounded (a full queue blocks the producer)."""
+
+    def __init__(self, max_queue=16):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._error = None
+
+    def setup(self, width, height):
+        self.width = width
+        self.height = height
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def write(self, frame):
+        """Queue *frame*, an ``(height, width, 4)`` uint8 RGBA array the
+        writer takes ownership of."""
+        self._check()
+        self._queue.put(frame)
+
+    def finish(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._close()
+        self._check()
+
+    def _consume(self):
+        index = 0
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            if self._error is None:
+                try:
+                    self._write(index, frame)
+                except Exception as e:
+                    self._error = e
+            index += 1
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _write(self, index, frame):
+        assert False, "Not implemented!"
+
+    def _close(self):
+        pass
+
+
+class PNGWriter(FrameWriter):
+    """Writes every frame to its own PNG file. *pattern* is formatted with
+    the frame index, e.g. ``'frames/frame_%05d.png'``."""
+
+    def __init__(self, pattern, **kwargs):
+        super(PNGWriter, self).__init__(**kwargs)
+        self.pattern = pattern
+
+    def setup(self, width, height):
+        directory = os.path.dirname(self.pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super(PNGWriter, self).setup(width, height)
+
+    def _write(self, index, frame):
+        mpl.image.imsave(self.pattern % index, frame)
+
+
+class FFMpegPipeWriter(FrameWriter):
+    """Pipes raw RGBA frames into an ffmpeg process (the binary configured
+    in matplotlib's ``animation.ffmpeg_path``)."""
+
+    def __init__(self, filename, fps=20, bitrate=1800, codec='libx264',
+                 **kwargs):
+        super(FFMpegPipeWriter, self).__init__(**kwargs)
+        self.filename = filename
+        self.fps = fps
+        self.bitrate = bitrate
+        self.codec = codec
+        self._proc = None
+
+    def setup(self, width, height):
+        # ffmpeg's stderr is only read once it exits, so it must stay quiet
+        # while encoding or a full pipe would stall it
+        command = [mpl.rcParams['animation.ffmpeg_path'], '-y',
+                   '-loglevel', 'error', '-nostats',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                   '-s', '%dx%d' % (width, height), '-r', str(self.fps),
+                   '-i', 'pipe:', '-vcodec', self.codec,
+                   '-pix_fmt', 'yuv420p', '-b:v', '%dk' % self.bitrate,
+                   self.filename]
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                      stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.PIPE)
+        super(FFMpegPipeWriter, self).setup(width, height)
+
+    def _write(self, index, frame):
+        self._proc.stdin.write(frame.data)
+
+    def _close(self):
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        err = proc.stderr.read()
+        proc.stderr.close()
+        # A pipe broken by a failing ffmpeg is better explained by its output
+        if proc.wait() != 0 and (self._error is None or
+                                 isinstance(self._error, BrokenPipeError)):
+            self._error = RuntimeError('ffmpeg failed:\n' +
+                                       err.decode(errors='replace'))
+
+
+def writer_for(filename, fps=20, **kwargs):
+    """A :class:`PNGWriter` when *filename* is a ``%``-pattern ending in
+    ``.png``, a :class:`FFMpegPipeWriter` otherwise."""
+    if filename.lower().endswith('.png') and '%' in filename:
+        return PNGWriter(filename, **kwargs)
+    return FFMpegPipeWriter(filename, fps=fps, **kwargs)
+
+
+class HeadlessDisplay(object):
+    """Window-less :class:`simcx.Display`: steps the simulators and lays out
+    the :class:`simcx.MplVisual` instances the same way (``(x, y)`` is the
+    bottom left corner), but frames are taken from the Agg canvases instead
+    of an OpenGL color buffer."""
+
+    def __init__(self, steps_per_frame=1, interval=0.05):
+        self.width = 0
+        self.height = 0
+        self._steps_per_frame = steps_per_frame
+        self._interval = interval
+        self._sims = []
+        self._visuals = []
+        self._pos = []
+
+    def add_simulator(self, sim: Simulator):
+        if sim not in self._sims:
+            self._sims.append(sim)
+
+    def add_visual(self, visual: MplVisual, x=0, y=0):
+        if not isinstance(visual, MplVisual):
+            raise Exception('Only MplVisual instances can render headless')
+        if visual not in self._visuals:
+            self._visuals.append(visual)
+            self._pos.append((x, y))
+            self.width = max(self.width, x + visual.width)
+            self.height = max(self.height, y + visual.height)
+            visual.draw()
+            visual.update_image()
+
+    def step(self):
+        self.run(1)
+
+    def frame(self):
+        """The current frame as a new ``(height, width, 4)`` RGBA array."""
+        frame = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        for vis, (x, y) in zip(self._visuals, self._pos):
+            top = self.height - y - vis.height
+            frame[top:top + vis.height, x:x + vis.width] = \
+                np.asarray(vis.canvas.buffer_rgba())
+        return frame
+
+    def record(self, filename, n_frames, fps=None, **kwargs):
+        """Step *n_frames* times and write every frame to *filename*, a
+        video file or a PNG pattern (see :func:`writer_for`)."""
+        if fps is None:
+            fps = round(1 / self._interval)
+        writer = writer_for(filename, fps=fps, **kwargs)
+        writer.setup(self.width, self.height)
+        try:
+            writer.write(self.frame())
+            for _ in range(n_frames):
+                self.step()
+                writer.write(self.frame())
+        finally:
+            writer.finish()
+
+    def run(self, n_frames):
+        """Step *n_frames* times without writing anything, e.g. before saving
+        a visual's figure. The visuals are only rendered once, at the end."""
+        for _ in range(n_frames * self._steps_per_frame):
+            for sim in self._sims:
+                sim.step(self._interval)
+                sim.dirty = True
+        self._render()
+
+    def _render(self):
+        visuals = [vis for vis in self._visuals if vis.sim.dirty]
+        for vis in visuals:
+            vis.draw()
+            vis.update_image()
+        for vis in visuals:
+            vis.sim.dirty = False
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015-2018 Tiago Baptista
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+"""
+Matplotlib based visuals. Importing this module selects the Agg backend.
+
+"""
+
+from __future__ import division
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+import matplotlib.pyplot as plt
+import matplotlib as mpl
+from . import Simulator, Visual
+
+mpl.use('Agg')
+# Better Graphics
+mpl.style.use("ggplot")
+
+__docformat__ = 'restructuredtext'
+__author__ = 'Tiago Baptista'
+
+
+class MplVisual(Visual):
+    def __init__(self, sim: Simulator, **kwargs):
+        super(MplVisual, self).__init__(sim, width=kwargs.get('width', 500),
+                                        height=kwargs.get('height', 500))
+
+        self.dpi = 80
+        self.figure = plt.figure(figsize=(self.width/self.dpi,
+                                          self.height/self.dpi),
+                                 dpi=self.dpi)
+        self._create_canvas()
+
+    def _create_canvas(self):
+        self.canvas = FigureCanvas(self.figure)
+        self._texture = None
+        self._image = None
+        self.update_image()
+
+    def snapshot(self):
+        """Give the lines of the figure their own copy of the data they
+        show, which may still be the simulator's, so :meth:`update_image`
+        can run while the simulator steps on."""
+        for ax in self.figure.axes:
+            for line in ax.lines:
+                if hasattr(line, 'get_data_3d'):
+                    line.set_data_3d(*(np.array(a)
+                                       for a in line.get_data_3d()))
+                else:
+                    line.set_data(np.array(line.get_xdata(orig=True)),
+                                  np.array(line.get_ydata(orig=True)))
+
+    def update_image(self):
+        """Render the figure. The pixels stay in the Agg renderer's buffer
+        until :attr:`image` is next needed."""
+        self.canvas.draw()
+        self._stale = True
+
+    @property
+    def image(self):
+        """Texture holding the latest rendering of the figure.
+
+        The Agg RGBA buffer is uploaded straight into one persistent
+        texture, without intermediate copies. Agg rows run top to bottom,
+        so the texture is shown through a vertically flipped region instead
+        of reordering the rows."""
+        # Only needed on screen, headless rendering never loads pyglet
+        import pyglet
+
+        if self._texture is None:
+            self._texture = pyglet.image.Texture.create(self.width,
+                                                        self.height)
+            self._image = self._texture.get_transform(flip_y=True)
+            self._image.anchor_y = 0
+        if self._stale:
+            pixels = np.asarray(self.canvas.buffer_rgba())
+            gl = pyglet.gl
+            gl.glBindTexture(self._texture.target, self._texture.id)
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+            gl.glTexSubImage2D(self._texture.target, self._texture.level,
+                               0, 0, self.width, self.height, gl.GL_RGBA,
+                               gl.GL_UNSIGNED_BYTE, pixels.ctypes.data)
+            self._stale = False
+        return self._image
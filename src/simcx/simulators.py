@@ -55,12 +55,14 @@ class FunctionIterator(Simulator):
             self._state[i] = self.func(self._state[i])
             self.y[i].append(self._state[i])
         self.x.append(self.time)
+        self.dirty = True
 
     def reset(self):
         self._state = [y[0] for y in self.y]
         self.time = 0
         self.x = [0]
         self.y = [[state] for state in self._state]
+        self.dirty = True
 
 
 class FunctionIterator2D(Simulator):
@@ -79,6 +81,7 @@ class FunctionIterator2D(Simulator):
         self.x.append(self.time)
         self.y[0].append(self._state[0])
         self.y[1].append(self._state[1])
+        self.dirty = True
 
 
 class FinalStateIterator(Simulator):
@@ -110,6 +113,7 @@ class FinalStateIterator(Simulator):
             self.x = np.zeros(self._samples)
             self.x += self._a
             self._a += self._delta
+            self.dirty = True
 
 
 class IFS(Simulator):
@@ -140,6 +144,8 @@ class IFS(Simulator):
             self._point = transform.transform_point(self._point)
             if not discard:
                 self.draw_points.append(self._point)
+        if not discard:
+            self.dirty = True
 
 
 class JuliaSet(Simulator):
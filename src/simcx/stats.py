@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2015-2017 Tiago Baptista
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+
+"""
+This module provides the timing instrumentation used by
+:class:`simcx.Display` to tell where the time of an interactive session
+goes.
+
+"""
+
+from __future__ import division
+import contextlib
+import json
+import threading
+import time
+
+__docformat__ = 'restructuredtext'
+__author__ = 'Tiago Baptista'
+
+
+class _Phase(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = float('inf')
+        self.max = 0.
+        # Bucket k counts the durations below 2**k microseconds
+        self.histogram = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = int(seconds * 1e6).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def summary(self):
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else 0.,
+                'min': self.min if self.count else 0.,
+                'max': self.max,
+                'histogram_us': [[2 ** k, n] for k, n
+                                 in sorted(self.histogram.items())]}
+
+
+class _Timer(object):
+    __slots__ = ('_stats', '_phase', '_start')
+
+    def __init__(self, stats, phase):
+        self._stats = stats
+        self._phase = phase
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self._stats.record(self._phase, time.perf_counter() - self._start)
+
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+class Stats(object):
+    """Per-phase call counts, total/min/max times and power of two
+    histograms of the durations.
+
+    Timing is off unless *enabled*; while off, :meth:`time` hands out a
+    shared no-op context manager, so instrumented code pays next to nothing.
+    Records may come from several threads."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+            self._started = time.perf_counter()
+
+    def time(self, phase):
+        """Context manager timing one occurrence of *phase*."""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, phase)
+
+    def record(self, phase, seconds):
+        with self._lock:
+            if phase not in self._phases:
+                self._phases[phase] = _Phase()
+            self._phases[phase].add(seconds)
+
+    def summary(self):
+        with self._lock:
+            return {'elapsed': time.perf_counter() - self._started,
+                    'phases': {name: phase.summary()
+                               for name, phase in self._phases.items()}}
+
+    def lines(self, counters=None):
+        """Short text report, one line per phase (and counter)."""
+        summary = self.summary()
+        elapsed = max(summary['elapsed'], 1e-9)
+        lines = []
+        for name, phase in sorted(summary['phases'].items()):
+            lines.append('%-12s %8.2f ms  %6.1f/s  %5.1f%%' % (
+                name, 1e3 * phase['mean'], phase['count'] / elapsed,
+                100 * phase['total'] / elapsed))
+        for name, value in sorted((counters or {}).items()):
+            lines.append('%-12s %8d  %8.1f/s' % (name, value,
+                                                 value / elapsed))
+        return lines
+
+    def save(self, filename, counters=None):
+        """Write the summary, plus any extra *counters*, as JSON."""
+        summary = self.summary()
+        summary['counters'] = counters or {}
+        with open(filename, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -28,6 +28,7 @@ from .simulators import FunctionIterator, FunctionIterator2D, FinalStateIterator
 import numpy as np
 import pyglet
 import matplotlib as mpl
+from matplotlib.transforms import nonsingular
 
 __docformat__ = 'restructuredtext'
 __author__ = 'Tiago Baptista'
@@ -37,6 +38,63 @@ __author__ = 'Tiago Baptista'
 mpl.style.use("seaborn")
 
 
+class Bounds(object):
+    """Running minimum and maximum of a growing sequence.
+
+    Each call to :meth:`update` only scans the items appended since the
+    previous call, so keeping the bounds current is O(new items). A shorter
+    or different sequence starts the bounds over."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, seq=None):
+        self._seq = seq
+        self._n = 0
+        self.lower = self.upper = None
+
+    def update(self, seq):
+        if seq is not self._seq or len(seq) < self._n:
+            self.reset(seq)
+        if len(seq) > self._n:
+            new = np.asarray(seq[self._n:], dtype=float)
+            new = new[np.isfinite(new)]
+            if new.size:
+                lower, upper = new.min(), new.max()
+                if self.lower is not None:
+                    lower = min(lower, self.lower)
+                    upper = max(upper, self.upper)
+                self.lower, self.upper = lower, upper
+            self._n = len(seq)
+
+    def limits(self, margin=0.05):
+        """The bounds widened by the same *margin* autoscaling uses, or
+        ``None`` when no finite item was seen yet."""
+        if self.lower is None:
+            return None
+        lower, upper = nonsingular(self.lower, self.upper)
+        pad = margin * (upper - lower)
+        return lower - pad, upper + pad
+
+
+def _autoscale(ax, x_bounds, y_bounds, current):
+    # Merge the bounds of every line and only touch the axes on change
+    xlim = _merge(b.limits() for b in x_bounds)
+    ylim = _merge(b.limits() for b in y_bounds)
+    if xlim is None or ylim is None or (xlim, ylim) == current:
+        return current
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    return xlim, ylim
+
+
+def _merge(limits):
+    limits = [lim for lim in limits if lim is not None]
+    if not limits:
+        return None
+    return min(lim[0] for lim in limits), max(lim[1] for lim in limits)
+
+
 class Line(MplVisual):
     def __init__(self, sim: Simulator, x: list, y: list, auto_size=True,
                  **kwargs):
@@ -46,6 +104,9 @@ class Line(MplVisual):
 
         self._x = x
         self._y = y
+        self._x_bounds = Bounds()
+        self._y_bounds = Bounds()
+        self._limits = None
 
         self.ax = self.figure.add_subplot(111)
         self.l, = self.ax.plot(self._x, self._y)
@@ -53,8 +114,10 @@ class Line(MplVisual):
     def draw(self):
         self.l.set_data(self._x, self._y)
         if self._auto_size:
-            self.ax.relim()
-            self.ax.autoscale_view()
+            self._x_bounds.update(self._x)
+            self._y_bounds.update(self._y)
+            self._limits = _autoscale(self.ax, [self._x_bounds],
+                                      [self._y_bounds], self._limits)
 
 
 class Lines(MplVisual):
@@ -68,14 +131,20 @@ class Lines(MplVisual):
         for i in range(len(self.sim.y)):
             line, = self.ax.plot(self.sim.x, self.sim.y[i])
             self._lines.append(line)
+        self._x_bounds = Bounds()
+        self._y_bounds = [Bounds() for _ in self._lines]
+        self._limits = None
 
     def draw(self):
         for i in range(len(self._lines)):
             self._lines[i].set_data(self.sim.x, self.sim.y[i])
 
         if self._auto_size:
-            self.ax.relim()
-            self.ax.autoscale_view()
+            self._x_bounds.update(self.sim.x)
+            for bounds, y in zip(self._y_bounds, self.sim.y):
+                bounds.update(y)
+            self._limits = _autoscale(self.ax, [self._x_bounds],
+                                      self._y_bounds, self._limits)
 
 
 class TimeSeries(Lines):